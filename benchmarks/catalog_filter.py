@@ -0,0 +1,56 @@
+"""
+Catalog Filter Benchmark - Peers contacted per search with Bloom catalogs
+
+Builds the advertised catalog filter of N simulated peers that share F
+random files each, then looks up files held by one peer (and files held
+by nobody) and counts how many peers each lookup would contact, versus
+asking every peer for its full catalog. Also reports the size of one
+advertised filter. Usage:
+
+    python benchmarks/catalog_filter.py [peers] [files_per_peer] [lookups]
+"""
+import json
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from catalog_filter import CatalogFilter, BloomFilter, name_key, hash_key
+
+
+def main():
+    peers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    files_per_peer = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    lookups = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    catalogs = []
+    holdings = []
+    for _ in range(peers):
+        catalog = CatalogFilter()
+        files = [(f"file-{os.urandom(6).hex()}.mkv", os.urandom(32).hex()) for _ in range(files_per_peer)]
+        for name, content_hash in files:
+            catalog.add([name_key(name), hash_key(content_hash)])
+        catalogs.append(BloomFilter.from_wire(catalog.to_wire()))
+        holdings.append(files)
+    wire_bytes = len(json.dumps(catalog.to_wire()))
+
+    contacted = 0
+    found = 0
+    for _ in range(lookups):
+        holder = random.randrange(peers)
+        name, content_hash = random.choice(holdings[holder])
+        candidates = [i for i, bloom in enumerate(catalogs) if hash_key(content_hash) in bloom]
+        contacted += len(candidates)
+        found += holder in candidates
+    absent = sum(sum(hash_key(os.urandom(32).hex()) in bloom for bloom in catalogs)
+                 for _ in range(lookups))
+
+    print(f"{peers} peers x {files_per_peer} files, advertised filter {wire_bytes} bytes of JSON")
+    print(f"Held files: holder found in {found}/{lookups} lookups, "
+          f"{contacted / lookups:.2f} peers contacted per lookup (vs {peers})")
+    print(f"Missing files: {absent / lookups:.2f} peers contacted per lookup (vs {peers})")
+
+
+if __name__ == "__main__":
+    main()
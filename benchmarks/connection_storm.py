@@ -0,0 +1,90 @@
+"""
+Connection Storm Load Test - Handshake latency of a normal peer under a storm
+
+Measures how long connect_to_peer takes against a local server, first
+on a quiet server and then while storm threads on another loopback
+address (127.0.0.2) open connections as fast as they can and hold them
+idle. Admission control should keep the normal peer's latency flat and
+turn the storm away with 'busy' replies. Linux only (needs 127.0.0.2).
+Usage:
+
+    python benchmarks/connection_storm.py [storm_threads] [handshakes]
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from network_manager import NetworkManager
+
+PORT = 5700
+
+
+def storm(stop: threading.Event, counts: dict):
+    """Open connections from 127.0.0.2 and hold them without sending"""
+    held = []
+    while not stop.is_set():
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            sock.bind(('127.0.0.2', 0))
+            sock.settimeout(2)
+            sock.connect(('127.0.0.1', PORT))
+            counts['opened'] += 1
+            held.append(sock)
+            if len(held) > 50:
+                held.pop(0).close()
+        except OSError:
+            counts['failed'] += 1
+            sock.close()
+    for sock in held:
+        sock.close()
+
+
+def measure(client: NetworkManager, handshakes: int):
+    latencies = []
+    for _ in range(handshakes):
+        start = time.perf_counter()
+        ok = client.connect_to_peer('127.0.0.1', PORT, 'client')
+        if ok:
+            latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    if not latencies:
+        return 0, None, None
+    return len(latencies), latencies[len(latencies) // 2], latencies[int(len(latencies) * 0.99) - 1]
+
+
+def main():
+    storm_threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    handshakes = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    server = NetworkManager(host='127.0.0.1', port=PORT, pex_interval=0,
+                            max_connections=10, max_connections_per_ip=4)
+    client = NetworkManager(host='127.0.0.1', port=PORT + 1, pex_interval=0)
+    server.start()
+    time.sleep(0.2)
+    try:
+        ok, p50, p99 = measure(client, handshakes)
+        print(f"Quiet:  {ok}/{handshakes} handshakes, p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+
+        stop = threading.Event()
+        counts = {'opened': 0, 'failed': 0}
+        threads = [threading.Thread(target=storm, args=(stop, counts), daemon=True)
+                   for _ in range(storm_threads)]
+        for thread in threads:
+            thread.start()
+        time.sleep(1)
+        ok, p50, p99 = measure(client, handshakes)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        print(f"Storm:  {ok}/{handshakes} handshakes, p50 {p50:.2f} ms, p99 {p99:.2f} ms")
+        print(f"Storm connections opened {counts['opened']}, failed {counts['failed']}")
+        print(f"Server admission stats: {server.admission.get_stats()}")
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+DHT Lookup Benchmark - Provider lookups across many loopback DHT nodes
+
+Starts N DHT nodes on 127.0.0.1, joins each through a random earlier
+node, announces one file and measures how many RPCs provider lookups
+take from random nodes. Usage:
+
+    python benchmarks/dht_lookup.py [nodes] [lookups]
+"""
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from dht import DHTNode
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    nodes = [DHTNode(f"node{i:06d}", host='127.0.0.1', port=0, tcp_port=6000 + i, k=8, rpc_timeout=0.5)
+             for i in range(count)]
+    for node in nodes:
+        node.start()
+    try:
+        start = time.perf_counter()
+        for i, node in enumerate(nodes[1:], 1):
+            node.bootstrap([('127.0.0.1', nodes[random.randrange(i)].port)])
+        print(f"Joined {count} nodes in {time.perf_counter() - start:.1f}s")
+
+        content_hash = os.urandom(32).hex()
+        holder = random.choice(nodes)
+        holder.announce(content_hash)
+        time.sleep(0.5)
+
+        found = 0
+        messages = []
+        for node in random.sample(nodes, min(lookups, count)):
+            before = node.rpcs_sent
+            providers = node.find_providers(content_hash)
+            messages.append(node.rpcs_sent - before)
+            found += any(p['peer_id'] == holder.peer_id for p in providers)
+        print(f"Found the provider in {found}/{len(messages)} lookups")
+        print(f"RPCs per lookup: mean {sum(messages) / len(messages):.1f}, max {max(messages)}"
+              f" (log2 N = {math.log2(count):.1f})")
+    finally:
+        for node in nodes:
+            node.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+PEX Convergence Benchmark - Gossip rounds until every node knows every peer
+
+Simulates N nodes in one process with the real PeerExchange delta logic
+but no sockets. Every node starts out knowing only the seed (node 0),
+and the seed knows every node from their handshakes, as after each node
+connected to one seed IP. In each round every node exchanges deltas with
+PEX_FANOUT random known peers, as _gossip_peers does once per
+PEX_INTERVAL. Reports the rounds, and the time at the configured
+interval, until all nodes hold the full peer table. Usage:
+
+    python benchmarks/pex_convergence.py [nodes] [fanout] [max_entries]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from config import NETWORK_CONFIG
+from peer_exchange import PeerExchange
+
+
+def exchange(a: str, b: str, pex: dict, tables: dict):
+    """One pex round trip from a to b, as _exchange_peers and _handle_pex do it"""
+    added, dropped = pex[a].build_delta(b, tables[a])
+    if a not in tables[b]:
+        tables[b][a] = {'ip': '127.0.0.1', 'port': 0, 'name': 'Unknown'}
+    pex[b].apply_delta(a, added, dropped, tables[b])
+    reply_added, reply_dropped = pex[b].build_delta(a, tables[b])
+    pex[b].mark_sent(a, reply_added, reply_dropped)
+    pex[a].mark_sent(b, added, dropped)
+    pex[a].apply_delta(b, reply_added, reply_dropped, tables[a])
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    fanout = int(sys.argv[2]) if len(sys.argv) > 2 else NETWORK_CONFIG['PEX_FANOUT']
+    max_entries = int(sys.argv[3]) if len(sys.argv) > 3 else NETWORK_CONFIG['PEX_MAX_ENTRIES']
+    interval = NETWORK_CONFIG['PEX_INTERVAL']
+
+    ids = [f"node{i:06d}" for i in range(count)]
+    seed = ids[0]
+    pex = {node: PeerExchange(node, fanout, max_entries) for node in ids}
+    tables = {node: {seed: {'ip': '127.0.0.1', 'port': 0, 'name': 'Seed'}} for node in ids[1:]}
+    tables[seed] = {node: {'ip': '127.0.0.1', 'port': 0, 'name': 'Unknown'} for node in ids[1:]}
+
+    start = time.perf_counter()
+    rounds = 0
+    most = None  # Round in which 99% of nodes had the full view
+    while any(len(table) < count - 1 for table in tables.values()):
+        rounds += 1
+        order = ids[:]
+        random.shuffle(order)
+        for node in order:
+            for target in pex[node].pick_targets(tables[node]):
+                exchange(node, target, pex, tables)
+        full = sum(len(table) == count - 1 for table in tables.values())
+        if most is None and full >= 0.99 * count:
+            most = rounds
+        print(f"Round {rounds}: {full}/{count} nodes have the full view")
+
+    print(f"{count} nodes, fanout {fanout}, {max_entries} entries per message "
+          f"(simulated in {time.perf_counter() - start:.1f}s):")
+    print(f"99% of nodes have the full view after {most} rounds, about {most * interval:.0f}s"
+          f" at a {interval}s interval")
+    print(f"All nodes have the full view after {rounds} rounds, about {rounds * interval:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
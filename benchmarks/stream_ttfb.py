@@ -0,0 +1,67 @@
+"""
+Streaming Time-to-First-Byte Benchmark - Playback start vs whole-file download
+
+Shares a file of random data from one local node and streams it to
+another through the local HTTP range server. Reports the time from
+stream_file() to the first byte a player would read, the first byte
+after a seek near the end of the file, and the time for the whole
+stream to complete. Usage:
+
+    python benchmarks/stream_ttfb.py [size_mb]
+"""
+import os
+import sys
+import tempfile
+import time
+import urllib.request
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from network_manager import NetworkManager
+
+PORT = 5750
+
+
+def first_byte(url: str, start: int = None) -> float:
+    """Seconds until the first body byte of a GET (optionally ranged) arrives"""
+    request = urllib.request.Request(url)
+    if start is not None:
+        request.add_header('Range', f"bytes={start}-")
+    begin = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        response.read(1)
+        return time.perf_counter() - begin
+
+
+def main():
+    size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    with tempfile.TemporaryDirectory() as seed_dir, tempfile.TemporaryDirectory() as viewer_dir:
+        with open(os.path.join(seed_dir, 'movie.mp4'), 'wb') as f:
+            for _ in range(size_mb):
+                f.write(os.urandom(1024 * 1024))
+        seed = NetworkManager(host='127.0.0.1', port=PORT, shared_dir=seed_dir, pex_interval=0)
+        viewer = NetworkManager(host='127.0.0.1', port=PORT + 1, shared_dir=viewer_dir, pex_interval=0)
+        seed.start()
+        time.sleep(0.2)
+        try:
+            start = time.perf_counter()
+            url = viewer.stream_file('movie.mp4', '127.0.0.1', PORT)
+            setup = time.perf_counter() - start
+            ttfb = first_byte(url)
+            print(f"{size_mb} MB file: stream setup {setup * 1000:.1f} ms, "
+                  f"first byte {(setup + ttfb) * 1000:.1f} ms")
+            seek = first_byte(url, size_mb * 1024 * 1024 * 9 // 10)
+            print(f"Seek to 90%: first byte after {seek * 1000:.1f} ms")
+
+            download = viewer.streams['movie.mp4']
+            while not download.complete and download.error is None:
+                time.sleep(0.01)
+            total = time.perf_counter() - start
+            print(f"Whole file streamed in {total:.2f}s ({size_mb / total:.0f} MB/s)")
+        finally:
+            viewer.stop()
+            seed.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,10 +6,36 @@ Configuration file for P2P File Sharing Application
 NETWORK_CONFIG = {
     'SERVER_PORT': 5000,          # Main server port for P2P connections
     'DISCOVERY_PORT': 5001,       # UDP broadcast port for peer discovery
-    'BUFFER_SIZE': 4096,          # Size of data chunks for file transfer
+    'BUFFER_SIZE': 65536,         # Initial data chunk size, then tuned per peer
     'DISCOVERY_INTERVAL': 3,      # Interval in seconds to broadcast discovery
     'CONNECTION_TIMEOUT': 5,      # Timeout for connection attempts in seconds
+    'TRANSFER_IDLE_TIMEOUT': 60,  # Seconds a running transfer may stall before it is dropped
     'MAX_CONNECTIONS': 10,        # Maximum concurrent peer connections
+    'MAX_CONNECTIONS_PER_IP': 4,  # Maximum concurrent connections from one IP address
+    'LISTEN_BACKLOG': 128,        # Kernel accept queue length for the server socket
+    'RETRY_AFTER': 2,             # Base seconds a rejected peer is told to wait (jittered)
+    'MAX_MAPPED_BYTES': 1024 * 1024 * 1024,  # Budget for shared mmaps of uploaded files
+    'CHUNK_CACHE_BYTES': 64 * 1024 * 1024,   # Budget for the in-memory hot chunk cache
+    'MAX_PIPELINE_DEPTH': 256,    # Upper bound on received buffers queued for the disk writer
+    'FSYNC_INTERVAL_BYTES': 64 * 1024 * 1024,  # Bytes written between fsync checkpoints
+    'MAX_SOCKET_BUFFER': 8 * 1024 * 1024,     # Upper bound for tuned SO_SNDBUF/SO_RCVBUF
+    'ENCRYPTION': False,          # TLS for peer connections (needs openssl for the identity)
+    'REQUIRE_TLS': True,          # With ENCRYPTION, refuse plaintext peers; False lets them handshake and exchange peers, never transfer data
+    'DHT_PORT': None,             # UDP port for the Kademlia DHT (e.g. 5002); None disables it
+    'DHT_BOOTSTRAP': [],          # Known DHT nodes as (ip, port) tuples
+    'PEX_INTERVAL': 30,           # Seconds between peer exchange rounds (0 disables PEX)
+    'PEX_FANOUT': 3,              # Peers contacted per peer exchange round
+    'PEX_MAX_ENTRIES': 100,       # Max added/dropped peers per exchange message
+    'UPLOAD_SLOTS': 4,            # Peers unchoked for uploads at once, including the optimistic one
+    'RECHOKE_INTERVAL': 10,       # Seconds between upload slot re-evaluations
+    'OPTIMISTIC_UNCHOKE_ROUNDS': 3,  # Rechokes before the optimistic unchoke rotates
+    'STREAM_HTTP_PORT': 0,        # Local HTTP port for streaming playback (0 = any free port)
+    'STREAM_CHUNK_SIZE': 256 * 1024,  # Bytes per chunk request in streaming mode
+    'STREAM_READ_AHEAD': 8,       # Chunk requests kept in flight ahead of the playhead
+    'STREAM_WAIT_TIMEOUT': 10,    # Seconds a player request waits for missing data
+    'CATALOG_FILTER_BITS': 32768, # Bloom filter size advertised for our catalog (~1% false positives at 1700 files)
+    'CATALOG_FILTER_HASHES': 7,   # Hash functions per catalog entry
+    'CATALOG_REFRESH_INTERVAL': 10,  # Seconds between shared directory rescans for the catalog
 }
 
 # Application Configuration
@@ -26,6 +52,8 @@ FILE_CONFIG = {
     'SHARED_FILES_DIR': './shared_files',
     'MAX_FILE_SIZE': 5 * 1024 * 1024 * 1024,  # 5 GB max file size
     'ALLOWED_EXTENSIONS': [],  # Empty means all extensions allowed
+    'CHUNK_STORE': False,      # Keep shared files as manifests over a deduplicating chunk store
+    'CHUNK_STORE_CHUNK_SIZE': 256 * 1024,  # Bytes per content-addressed chunk
 }
 
 # UI Theme Configuration
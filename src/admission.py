@@ -0,0 +1,160 @@
+"""
+Admission Control - Caps concurrent connection handlers for the listener
+"""
+import json
+import random
+import socket
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+try:
+    import resource
+except ImportError:  # Windows has no RLIMIT_NOFILE
+    resource = None
+
+
+class PeerBusyError(ConnectionError):
+    """A peer turned our connection away; retry_after is its hint in seconds"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Peer is busy, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Admits connections up to a global and a per-IP limit
+
+    Connections over either limit are turned away from the accept loop
+    itself with a short 'busy' message carrying a jittered retry_after
+    hint, so a connection storm never spawns handler threads or delays
+    peers that were already admitted.
+    """
+
+    CLOSE_DELAY = 1.0    # Seconds a rejected socket lingers so the client can read the hint
+    MAX_CLOSING = 1024   # Upper bound on rejected sockets held at once
+    MIN_CLOSING = 16     # Lower bound, however low the descriptor limit
+    PADDING = b' ' * 16  # Blank lead-in a TLS client reads as a record header (see reject)
+
+    def __init__(self, max_handlers: int = 10, max_per_ip: int = 4, retry_after: float = 2.0):
+        self.max_handlers = max_handlers
+        self.max_per_ip = max_per_ip
+        self.retry_after = retry_after
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._per_ip: Dict[str, int] = {}
+        self._closing = deque()  # (deadline, socket) of rejected connections
+        self.max_closing = self._closing_cap()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _closing_cap(cls) -> int:
+        """Rejected sockets to hold at once: a quarter of the descriptor limit
+
+        Lingering rejects must never use up the descriptors that accept(),
+        handlers and transfers need, so the cap follows the soft
+        RLIMIT_NOFILE (256 by default on macOS) rather than a fixed count.
+        """
+        if resource is None:
+            return cls.MAX_CLOSING
+        try:
+            soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        except (OSError, ValueError):
+            return cls.MAX_CLOSING
+        if soft == resource.RLIM_INFINITY:
+            return cls.MAX_CLOSING
+        return max(cls.MIN_CLOSING, min(cls.MAX_CLOSING, soft // 4))
+
+    def try_admit(self, ip: str) -> bool:
+        """Reserve a handler slot for ip, or return False if over a limit"""
+        with self._lock:
+            if self.active >= self.max_handlers or self._per_ip.get(ip, 0) >= self.max_per_ip:
+                self.rejected += 1
+                return False
+            self.active += 1
+            self._per_ip[ip] = self._per_ip.get(ip, 0) + 1
+            self.admitted += 1
+            return True
+
+    def release(self, ip: str):
+        """Free the slot taken by a finished handler"""
+        with self._lock:
+            self.active -= 1
+            count = self._per_ip.get(ip, 0) - 1
+            if count > 0:
+                self._per_ip[ip] = count
+            else:
+                self._per_ip.pop(ip, None)
+
+    def reject(self, client_socket):
+        """Tell a client to come back later without blocking the accept loop
+
+        Closing right away could reset the connection before the client
+        reads the hint (its request is still unread), so the socket is
+        half-closed and reaped after CLOSE_DELAY. The hint is plaintext
+        even for TLS clients; it is led by blanks (still valid JSON) so
+        the client's record layer fails on those and leaves the hint
+        itself unread for it to pick up.
+        """
+        hint = round(self.retry_after * (1 + random.random()), 1)  # Jitter spreads retries
+        try:
+            client_socket.setblocking(False)
+            client_socket.send(self.PADDING + json.dumps({'type': 'busy', 'retry_after': hint}).encode('utf-8'))
+            client_socket.shutdown(socket.SHUT_WR)
+        except OSError:
+            self._close(client_socket)
+            return
+        self._closing.append((time.monotonic() + self.CLOSE_DELAY, client_socket))
+        if len(self._closing) > self.max_closing:
+            self._close(self._closing.popleft()[1])
+
+    def reap(self):
+        """Close rejected sockets whose linger time has passed"""
+        now = time.monotonic()
+        while self._closing and self._closing[0][0] <= now:
+            self._close(self._closing.popleft()[1])
+
+    def shed(self) -> int:
+        """Close the oldest half of the lingering rejects to free descriptors"""
+        count = (len(self._closing) + 1) // 2
+        for _ in range(count):
+            self._close(self._closing.popleft()[1])
+        return count
+
+    def close_all(self):
+        while self._closing:
+            self._close(self._closing.popleft()[1])
+
+    @staticmethod
+    def _close(client_socket):
+        try:
+            client_socket.recv(65536)  # Drain the unread request so close sends FIN, not RST
+        except OSError:
+            pass
+        try:
+            client_socket.close()
+        except OSError:
+            pass
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'active': self.active,
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+                'max_handlers': self.max_handlers,
+                'max_per_ip': self.max_per_ip,
+            }
+
+    @staticmethod
+    def retry_after_of(message: str):
+        """Return the retry_after hint if message is a busy rejection, else None"""
+        try:
+            data = json.loads(message)
+        except ValueError:
+            return None
+        if isinstance(data, dict) and data.get('type') == 'busy':
+            return data.get('retry_after', 0)
+        return None
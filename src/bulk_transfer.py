@@ -0,0 +1,173 @@
+"""
+Bulk Transfer - Streams whole directory trees over one connection
+"""
+import os
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Tuple
+
+try:
+    from .receive_pipeline import WriteBehindFile
+except ImportError:  # Imported as a top-level module from ui/main_app.py
+    from receive_pipeline import WriteBehindFile
+
+# Per-file frame header: relative path length, file size. A zero path
+# length marks the end of the stream.
+FILE_HEADER = struct.Struct('!HQ')
+
+
+def iter_tree(root: str) -> Iterator[Tuple[str, str, int]]:
+    """Yield (absolute path, relative '/'-separated path, size) of every file"""
+    for dir_path, dir_names, file_names in os.walk(root):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            path = os.path.join(dir_path, file_name)
+            if os.path.isfile(path):
+                rel_path = os.path.relpath(path, root).replace(os.sep, '/')
+                yield path, rel_path, os.path.getsize(path)
+
+
+def safe_join(root: str, rel_path: str) -> str:
+    """Resolve a received relative path, refusing anything outside root"""
+    parts = [p for p in rel_path.split('/') if p not in ('', '.')]
+    if not parts or any(p == '..' or os.sep in p or ':' in p for p in parts):
+        raise ValueError(f"Unsafe path in bulk transfer: {rel_path!r}")
+    return os.path.join(root, *parts)
+
+
+class BulkSender:
+    """Writes files back to back as header+data frames, batched into large sends"""
+
+    def __init__(self, sock, batch_bytes: int = 1024 * 1024, on_progress=None):
+        self.sock = sock
+        self.batch_bytes = batch_bytes
+        self.on_progress = on_progress  # Called with the byte count of each send
+        self._batch = []
+        self._batch_len = 0
+
+    def send_tree(self, root: str) -> Tuple[int, int]:
+        """Stream every file under root; returns (files, bytes) sent"""
+        files = 0
+        total = 0
+        for path, rel_path, size in iter_tree(root):
+            name = rel_path.encode('utf-8')
+            with open(path, 'rb') as f:
+                self._queue(FILE_HEADER.pack(len(name), size) + name)
+                remaining = size
+                while remaining > 0:
+                    data = f.read(min(self.batch_bytes, remaining))
+                    if not data:
+                        raise IOError(f"{rel_path} shrank while being sent")
+                    self._queue(data)
+                    remaining -= len(data)
+            files += 1
+            total += size
+        self._queue(FILE_HEADER.pack(0, 0))
+        self._flush()
+        return files, total
+
+    def _queue(self, data: bytes):
+        """Coalesce small frames so many files go out in one send"""
+        self._batch.append(data)
+        self._batch_len += len(data)
+        if self._batch_len >= self.batch_bytes:
+            self._flush()
+
+    def _flush(self):
+        if not self._batch:
+            return
+        self.sock.sendall(b''.join(self._batch))
+        if self.on_progress:
+            self.on_progress(self._batch_len)
+        self._batch = []
+        self._batch_len = 0
+
+
+class BulkReceiver:
+    """Parses a bulk stream and writes its files on a pool of writer threads
+
+    Files up to small_file_limit are read whole and written by the pool,
+    so many small files are created concurrently while the socket keeps
+    being drained. Larger files stream through a WriteBehindFile.
+    """
+
+    def __init__(self, sock, dest_root: str, recv_size: int = 256 * 1024, workers: int = 8,
+                 small_file_limit: int = 1024 * 1024, on_progress=None, max_bytes: int = None):
+        self.sock = sock
+        self.dest_root = dest_root
+        self.recv_size = recv_size
+        self.workers = workers
+        self.small_file_limit = small_file_limit
+        self.on_progress = on_progress  # Called with the byte count of each recv
+        self.max_bytes = max_bytes  # Announced total size; None accepts any amount
+        self._buffer = bytearray()
+        self._made_dirs = set()
+        self._dirs_lock = threading.Lock()
+
+    def receive(self) -> Tuple[int, int]:
+        """Receive files until the end marker; returns (files, bytes) written"""
+        files = 0
+        total = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = []
+            while True:
+                name_len, size = FILE_HEADER.unpack(self._read_exact(FILE_HEADER.size))
+                if name_len == 0:
+                    break
+                if self.max_bytes is not None and total + size > self.max_bytes:
+                    raise ValueError(f"Bulk transfer exceeds its announced {self.max_bytes} bytes")
+                path = safe_join(self.dest_root, self._read_exact(name_len).decode('utf-8'))
+                self._make_parent(path)
+                if size <= self.small_file_limit:
+                    pending.append(pool.submit(self._write_small, path, self._read_exact(size)))
+                else:
+                    self._write_large(path, size)
+                files += 1
+                total += size
+                # Surface write errors early and keep the pending list short
+                if len(pending) >= 4 * self.workers:
+                    for future in pending:
+                        future.result()
+                    pending = []
+            for future in pending:
+                future.result()
+        return files, total
+
+    def _read_exact(self, size: int) -> bytes:
+        """Read exactly size bytes from the buffered socket"""
+        while len(self._buffer) < size:
+            data = self.sock.recv(max(self.recv_size, size - len(self._buffer)))
+            if not data:
+                raise ConnectionError("Bulk transfer ended early")
+            self._buffer += data
+            if self.on_progress:
+                self.on_progress(len(data))
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _write_large(self, path: str, size: int):
+        """Stream one large file straight to its write-behind writer"""
+        writer = WriteBehindFile(path, size)
+        remaining = size
+        try:
+            while remaining > 0:
+                data = self._read_exact(min(self.recv_size, remaining))
+                writer.write(data)
+                remaining -= len(data)
+        finally:
+            writer.close(complete=remaining == 0)
+
+    @staticmethod
+    def _write_small(path: str, data: bytes):
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    def _make_parent(self, path: str):
+        parent = os.path.dirname(path)
+        with self._dirs_lock:
+            if parent in self._made_dirs:
+                return
+            os.makedirs(parent, exist_ok=True)
+            self._made_dirs.add(parent)
@@ -0,0 +1,112 @@
+"""
+Catalog Filter - Bloom filter summaries of the files a peer shares
+"""
+import base64
+import hashlib
+import threading
+from typing import Dict, Iterable, List, Optional
+
+MAX_FILTER_BITS = 1 << 20  # Largest filter accepted from a peer (128 KB)
+
+
+def name_key(file_name: str) -> str:
+    return 'name:' + file_name.lower()
+
+
+def hash_key(content_hash: str) -> str:
+    return 'hash:' + content_hash.lower()
+
+
+def _positions(item: str, num_bits: int, num_hashes: int) -> Iterable[int]:
+    """Bit positions of an item by double hashing one SHA-256 digest"""
+    digest = hashlib.sha256(item.encode('utf-8')).digest()
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:16], 'big') | 1
+    return ((h1 + i * h2) % num_bits for i in range(num_hashes))
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter as advertised by a peer"""
+
+    def __init__(self, num_bits: int = 32768, num_hashes: int = 7, data: bytes = None):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray(data) if data is not None else bytearray((num_bits + 7) // 8)
+
+    def add(self, item: str):
+        for position in _positions(item, self.num_bits, self.num_hashes):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in _positions(item, self.num_bits, self.num_hashes))
+
+    def to_wire(self) -> Dict:
+        return {'bits': self.num_bits, 'k': self.num_hashes,
+                'data': base64.b64encode(bytes(self.bits)).decode('ascii')}
+
+    @classmethod
+    def from_wire(cls, wire) -> Optional['BloomFilter']:
+        """Parse a peer's advertised filter, or None if it is malformed"""
+        try:
+            num_bits, num_hashes = int(wire['bits']), int(wire['k'])
+            data = base64.b64decode(wire['data'], validate=True)
+        except (KeyError, TypeError, ValueError):
+            return None
+        if not 0 < num_bits <= MAX_FILTER_BITS or not 0 < num_hashes <= 32 \
+                or len(data) != (num_bits + 7) // 8:
+            return None
+        return cls(num_bits, num_hashes, data)
+
+
+class CatalogFilter:
+    """Our own catalog as a counting Bloom filter
+
+    Each bit has a small counter so files can be removed as well as
+    added when the shared directory changes. The advertised form is the
+    plain Bloom filter of non-zero counters, rebuilt only after a change.
+    """
+
+    def __init__(self, num_bits: int = 32768, num_hashes: int = 7):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.item_count = 0
+        self._counters = bytearray(num_bits)
+        self._overflowed = set()  # Saturated counters are never decremented
+        self._wire = None
+        self._lock = threading.Lock()
+
+    def add(self, items: List[str]):
+        with self._lock:
+            for item in items:
+                for position in _positions(item, self.num_bits, self.num_hashes):
+                    if self._counters[position] == 255:
+                        self._overflowed.add(position)
+                    else:
+                        self._counters[position] += 1
+                self.item_count += 1
+            self._wire = None
+
+    def remove(self, items: List[str]):
+        with self._lock:
+            for item in items:
+                for position in _positions(item, self.num_bits, self.num_hashes):
+                    if position not in self._overflowed and self._counters[position]:
+                        self._counters[position] -= 1
+                self.item_count -= 1
+            self._wire = None
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._counters[position]
+                   for position in _positions(item, self.num_bits, self.num_hashes))
+
+    def to_wire(self) -> Dict:
+        """The advertised Bloom filter, cached until the catalog changes"""
+        with self._lock:
+            if self._wire is None:
+                bloom = BloomFilter(self.num_bits, self.num_hashes)
+                for position, count in enumerate(self._counters):
+                    if count:
+                        bloom.bits[position >> 3] |= 1 << (position & 7)
+                self._wire = bloom.to_wire()
+            return self._wire
@@ -0,0 +1,95 @@
+"""
+Chunk Cache - Shared in-memory LRU of frequently requested file chunks
+"""
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+ChunkKey = Tuple[str, int]  # (file version or stored chunk hash, chunk index)
+
+
+class ChunkCache:
+    """LRU chunk cache with a byte budget and second-hit admission
+
+    A chunk is only stored the second time it is requested within the
+    recent-history window, so one-off reads of large files cannot flush
+    the chunks that a swarm keeps asking for. Chunks are evicted least
+    recently used first once the cached bytes exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, chunk_size: int = 64 * 1024,
+                 history_size: int = 4096):
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.history_size = history_size  # Keys remembered for admission
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.admissions = 0
+        self.evictions = 0
+        self._chunks: 'OrderedDict[ChunkKey, bytes]' = OrderedDict()
+        self._seen: 'OrderedDict[ChunkKey, None]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: ChunkKey) -> Optional[bytes]:
+        """Return a cached chunk, or None on a miss"""
+        with self._lock:
+            data = self._chunks.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._chunks.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def admit(self, key: ChunkKey, data) -> bool:
+        """Offer a chunk read from disk; it is stored on its second sighting"""
+        if len(data) > self.max_bytes:
+            return False
+        with self._lock:
+            if key in self._chunks:
+                return True
+            if key not in self._seen:
+                self._seen[key] = None
+                if len(self._seen) > self.history_size:
+                    self._seen.popitem(last=False)
+                return False
+            del self._seen[key]
+            self._chunks[key] = bytes(data)
+            self.cached_bytes += len(data)
+            self.admissions += 1
+            while self.cached_bytes > self.max_bytes:
+                _, evicted = self._chunks.popitem(last=False)
+                self.cached_bytes -= len(evicted)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, file_id: str):
+        """Drop every cached chunk of one file version"""
+        with self._lock:
+            for key in [k for k in self._chunks if k[0] == file_id]:
+                self.cached_bytes -= len(self._chunks.pop(key))
+            for key in [k for k in self._seen if k[0] == file_id]:
+                del self._seen[key]
+
+    def clear(self):
+        """Empty the cache"""
+        with self._lock:
+            self._chunks.clear()
+            self._seen.clear()
+            self.cached_bytes = 0
+
+    def get_stats(self) -> Dict:
+        """Get hit/miss counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'admissions': self.admissions,
+                'evictions': self.evictions,
+                'chunks': len(self._chunks),
+                'cached_bytes': self.cached_bytes,
+                'max_bytes': self.max_bytes,
+            }
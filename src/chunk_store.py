@@ -0,0 +1,214 @@
+"""
+Chunk Store - Content-addressed, deduplicating storage for shared files
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+
+class ChunkStore:
+    """Keeps every unique chunk once, named by its SHA-256
+
+    A stored file is a small JSON manifest (name, size, chunk_size,
+    whole-file hash and the list of chunk hashes) placed in the shared
+    directory under <name>.manifest; its data lives in
+    root/chunks/<first two hex digits>/<hash>. Identical content shared
+    under several names, or received again from other peers, costs disk
+    space only once, and a download only needs the chunks that are not
+    already here. Chunks no manifest refers to are removed by
+    collect_garbage. An ingest or receive pins the chunks it relies on
+    until their manifest is written, and collect_garbage skips pinned
+    chunks instead of waiting, so it never deletes chunks a manifest is
+    about to list and never blocks behind a slow transfer.
+    """
+
+    MANIFEST_SUFFIX = '.manifest'
+
+    def __init__(self, root: str, chunk_size: int = 256 * 1024):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.chunks_dir = os.path.join(root, 'chunks')
+        self.stored_bytes = 0   # Chunk bytes written by this process
+        self.deduped_bytes = 0  # Chunk bytes that were already held
+        self._lock = threading.Lock()
+        self._pinned = Counter()   # Chunks ingests/receives rely on that may not be in a manifest yet
+        self._released = set()     # Chunks unpinned while a collection was running
+        self._collecting = False
+        self._gc_lock = threading.Lock()  # One collection at a time
+        os.makedirs(self.chunks_dir, exist_ok=True)
+
+    def chunk_path(self, chunk_hash: str) -> str:
+        return os.path.join(self.chunks_dir, chunk_hash[:2], chunk_hash)
+
+    def has_chunk(self, chunk_hash: str) -> bool:
+        return os.path.exists(self.chunk_path(chunk_hash))
+
+    def missing_chunks(self, chunk_hashes: Iterable[str]) -> Set[str]:
+        """Hashes from chunk_hashes that this store does not hold"""
+        return {h for h in set(chunk_hashes) if not self.has_chunk(h)}
+
+    def read_chunk(self, chunk_hash: str) -> bytes:
+        with open(self.chunk_path(chunk_hash), 'rb') as f:
+            return f.read()
+
+    def put_chunk(self, data, chunk_hash: str = None) -> str:
+        """Store one chunk unless it is already held; returns its hash"""
+        chunk_hash = chunk_hash or hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(chunk_hash)
+        if os.path.exists(path):
+            with self._lock:
+                self.deduped_bytes += len(data)
+            return chunk_hash
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a unique name first so readers never see a partial chunk
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        with self._lock:
+            self.stored_bytes += len(data)
+        return chunk_hash
+
+    def ingest(self, file_path: str, name: str = None, pin: Callable = None) -> Dict:
+        """Split a file into chunks, store them and return its manifest
+
+        pin, from hold(), protects each chunk from collect_garbage before
+        it is stored.
+        """
+        digest = hashlib.sha256()
+        chunks = []
+        size = 0
+        with open(file_path, 'rb') as f:
+            while True:
+                data = f.read(self.chunk_size)
+                if not data:
+                    break
+                digest.update(data)
+                chunk_hash = hashlib.sha256(data).hexdigest()
+                if pin:
+                    pin([chunk_hash])
+                chunks.append(self.put_chunk(data, chunk_hash))
+                size += len(data)
+        return {
+            'name': name or os.path.basename(file_path),
+            'size': size,
+            'chunk_size': self.chunk_size,
+            'hash': digest.hexdigest(),
+            'chunks': chunks
+        }
+
+    @contextmanager
+    def hold(self) -> Iterator[Callable[[Iterable[str]], None]]:
+        """Yield a pin function that keeps chunks from collect_garbage until exit
+
+        Pin chunks before checking whether they are held or storing them,
+        and leave only once the manifest listing them is written.
+        """
+        pinned = []
+
+        def pin(chunk_hashes: Iterable[str]):
+            chunk_hashes = list(chunk_hashes)
+            with self._lock:
+                self._pinned.update(chunk_hashes)
+            pinned.extend(chunk_hashes)
+
+        try:
+            yield pin
+        finally:
+            with self._lock:
+                self._pinned.subtract(pinned)
+                self._pinned += Counter()  # Drop chunks no longer pinned
+                if self._collecting:
+                    # The running collection may have read the manifests
+                    # before these chunks' manifest was written
+                    self._released.update(pinned)
+
+    def store_file(self, file_path: str, manifest_path: str, name: str = None) -> Dict:
+        """Ingest a file and write its manifest to manifest_path; returns the manifest"""
+        with self.hold() as pin:
+            manifest = self.ingest(file_path, name, pin)
+            self.write_manifest(manifest, manifest_path)
+        return manifest
+
+    def share_file(self, file_path: str, dest_dir: str, name: str = None) -> str:
+        """Ingest a file and write its manifest into dest_dir; returns the manifest path"""
+        name = name or os.path.basename(file_path)
+        manifest_path = os.path.join(dest_dir, name + self.MANIFEST_SUFFIX)
+        self.store_file(file_path, manifest_path, name)
+        return manifest_path
+
+    def materialize(self, manifest: Dict, dest_path: str):
+        """Reassemble the file a manifest describes as an ordinary file"""
+        with open(dest_path, 'wb') as f:
+            for chunk_hash in manifest['chunks']:
+                f.write(self.read_chunk(chunk_hash))
+
+    def collect_garbage(self, manifest_dirs: List[str]) -> int:
+        """Delete chunks no manifest in manifest_dirs refers to; returns bytes freed"""
+        with self._gc_lock:
+            with self._lock:
+                self._collecting = True
+                self._released.clear()
+            try:
+                return self._collect(manifest_dirs)
+            finally:
+                with self._lock:
+                    self._collecting = False
+                    self._released.clear()
+
+    def _collect(self, manifest_dirs: List[str]) -> int:
+        live = set()
+        for directory in manifest_dirs:
+            for file_name in os.listdir(directory):
+                if file_name.endswith(self.MANIFEST_SUFFIX):
+                    manifest = self.load_manifest(os.path.join(directory, file_name))
+                    if manifest:
+                        live.update(manifest['chunks'])
+        freed = 0
+        for prefix in os.listdir(self.chunks_dir):
+            prefix_dir = os.path.join(self.chunks_dir, prefix)
+            for chunk_hash in os.listdir(prefix_dir):
+                if chunk_hash not in live and not chunk_hash.endswith('.tmp'):
+                    path = os.path.join(prefix_dir, chunk_hash)
+                    # Checked and removed under the lock, so a chunk pinned
+                    # and found present is never deleted afterwards
+                    with self._lock:
+                        if chunk_hash in self._pinned or chunk_hash in self._released:
+                            continue
+                        try:
+                            size = os.path.getsize(path)
+                            os.remove(path)
+                            freed += size
+                        except OSError:
+                            pass
+        return freed
+
+    @staticmethod
+    def write_manifest(manifest: Dict, manifest_path: str):
+        temp_path = manifest_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(temp_path, manifest_path)
+
+    @staticmethod
+    def load_manifest(manifest_path: str) -> Optional[Dict]:
+        try:
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            if isinstance(manifest, dict) and isinstance(manifest.get('chunks'), list):
+                return manifest
+        except (OSError, ValueError) as e:
+            print(f"Error loading manifest {manifest_path}: {str(e)}")
+        return None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'chunk_size': self.chunk_size,
+                'stored_bytes': self.stored_bytes,
+                'deduped_bytes': self.deduped_bytes,
+            }
@@ -0,0 +1,53 @@
+"""
+Content Hash Index - Memoized SHA-256 digests of shared files
+"""
+import hashlib
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+
+class ContentHashIndex:
+    """Caches file content hashes until the file's size or mtime changes"""
+
+    def __init__(self, block_size: int = 1024 * 1024):
+        self.block_size = block_size
+        self._hashes: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._lock = threading.Lock()
+
+    def get_hash(self, file_path: str) -> str:
+        """Return the hex SHA-256 of a file, hashing it only when it changed"""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            while True:
+                block = f.read(self.block_size)
+                if not block:
+                    break
+                digest.update(block)
+        content_hash = digest.hexdigest()
+        with self._lock:
+            self._hashes[path] = (key, content_hash)
+        return content_hash
+
+    def cached_hash(self, file_path: str, stat: os.stat_result = None) -> Optional[str]:
+        """Return the memoized hash if it matches the file's current version, without hashing"""
+        path = os.path.abspath(file_path)
+        stat = stat or os.stat(path)
+        with self._lock:
+            cached = self._hashes.get(path)
+        if cached is not None and cached[0] == (stat.st_size, stat.st_mtime_ns):
+            return cached[1]
+        return None
+
+    def forget(self, file_path: str):
+        """Drop the cached hash of a removed or replaced file"""
+        with self._lock:
+            self._hashes.pop(os.path.abspath(file_path), None)
@@ -0,0 +1,413 @@
+"""
+DHT - Kademlia-style distributed hash table for peer and content lookup
+"""
+import hashlib
+import json
+import os
+import re
+import socket
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+ID_BITS = 160
+
+
+def dht_key(text: str) -> int:
+    """Map a peer_id or content hash onto the 160-bit key space"""
+    return int(hashlib.sha1(text.encode('utf-8')).hexdigest(), 16)
+
+
+def parse_key(text) -> int:
+    """Parse a key received on the wire; it must be exactly 40 hex digits"""
+    if not isinstance(text, str) or not re.fullmatch(r'[0-9a-fA-F]{40}', text):
+        raise ValueError(f"Invalid DHT key: {text!r}")
+    return int(text, 16)
+
+
+class Contact:
+    """A DHT node: its key, UDP address and the P2P peer behind it"""
+
+    def __init__(self, node_id: int, ip: str, port: int, peer_id: str, tcp_port: int):
+        self.node_id = node_id
+        self.ip = ip
+        self.port = port          # DHT (UDP) port
+        self.peer_id = peer_id
+        self.tcp_port = tcp_port  # P2P server port for transfers
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return (self.ip, self.port)
+
+    def to_dict(self) -> Dict:
+        return {
+            'node_id': format(self.node_id, '040x'),
+            'ip': self.ip,
+            'port': self.port,
+            'peer_id': self.peer_id,
+            'tcp_port': self.tcp_port,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict, ip: Optional[str] = None) -> 'Contact':
+        """Parse a contact, rejecting a node_id that is not derived from its peer_id"""
+        peer_id = data['peer_id']
+        node_id = parse_key(data['node_id'])
+        if not isinstance(peer_id, str) or node_id != dht_key(peer_id):
+            raise ValueError("DHT node_id does not match peer_id")
+        return cls(node_id, ip or data['ip'], int(data['port']), peer_id, int(data.get('tcp_port', 0)))
+
+
+class RoutingTable:
+    """k-buckets indexed by the highest differing bit of the XOR distance"""
+
+    def __init__(self, node_id: int, k: int = 20):
+        self.node_id = node_id
+        self.k = k
+        self.buckets: List['OrderedDict[int, Contact]'] = [OrderedDict() for _ in range(ID_BITS)]
+        self._lock = threading.Lock()
+
+    def _bucket_for(self, node_id: int) -> 'OrderedDict[int, Contact]':
+        return self.buckets[(self.node_id ^ node_id).bit_length() - 1]
+
+    def update(self, contact: Contact) -> Optional[Contact]:
+        """Record a live contact; returns the bucket's oldest entry if it is full"""
+        if contact.node_id == self.node_id:
+            return None
+        with self._lock:
+            bucket = self._bucket_for(contact.node_id)
+            if contact.node_id in bucket:
+                bucket[contact.node_id] = contact
+                bucket.move_to_end(contact.node_id)
+                return None
+            if len(bucket) < self.k:
+                bucket[contact.node_id] = contact
+                return None
+            return next(iter(bucket.values()))
+
+    def replace(self, stale: Contact, contact: Contact):
+        """Evict an unresponsive contact in favour of a new one"""
+        with self._lock:
+            bucket = self._bucket_for(stale.node_id)
+            bucket.pop(stale.node_id, None)
+            if len(bucket) < self.k:
+                bucket[contact.node_id] = contact
+
+    def closest(self, target: int, count: Optional[int] = None) -> List[Contact]:
+        """The count known contacts nearest to target by XOR distance"""
+        with self._lock:
+            contacts = [c for bucket in self.buckets for c in bucket.values()]
+        contacts.sort(key=lambda c: c.node_id ^ target)
+        return contacts[:count or self.k]
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(bucket) for bucket in self.buckets)
+
+
+class DHTNode:
+    """Kademlia node over UDP/JSON with iterative parallel lookups
+
+    Nodes are keyed by dht_key(peer_id) and content by
+    dht_key(content_hash). A provider record maps a content key to the
+    peers that hold the content. Lookups query alpha contacts at a time
+    and stop once the k closest nodes seen have all answered, so they
+    take O(log N) messages. Announced records are re-stored every
+    republish_interval and expire from other nodes after record_ttl.
+    Records stored for other nodes are capped at max_keys keys and k
+    providers per key; stores beyond that are dropped until records
+    expire.
+    """
+
+    def __init__(self, peer_id: str, host: str = "0.0.0.0", port: int = 5002, tcp_port: int = 5000,
+                 k: int = 20, alpha: int = 3, rpc_timeout: float = 1.0,
+                 republish_interval: float = 3600, record_ttl: float = 86400,
+                 max_keys: int = 10000, callback: Callable = None):
+        self.peer_id = peer_id
+        self.node_id = dht_key(peer_id)
+        self.host = host
+        self.port = port
+        self.tcp_port = tcp_port
+        self.k = k
+        self.alpha = alpha
+        self.rpc_timeout = rpc_timeout
+        self.republish_interval = republish_interval
+        self.record_ttl = record_ttl
+        self.max_keys = max_keys  # Bound on keys stored for other nodes
+        self.callback = callback
+        self.table = RoutingTable(self.node_id, k)
+        self.rpcs_sent = 0  # For measuring lookup cost
+        self.running = False
+        self.socket = None
+        self._records: Dict[int, Dict[str, Dict]] = {}  # {key: {peer_id: provider}}
+        self._published: Dict[int, str] = {}  # Keys we announce, for republishing
+        self._pending: Dict[str, Tuple[threading.Event, List]] = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=4 * alpha)
+
+    def start(self) -> bool:
+        """Bind the UDP socket and start the receive and maintenance threads"""
+        try:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.socket.bind((self.host, self.port))
+            self.port = self.socket.getsockname()[1]
+            self.running = True
+            threading.Thread(target=self._receive_loop, daemon=True).start()
+            threading.Thread(target=self._maintenance_loop, daemon=True).start()
+            return True
+        except Exception as e:
+            if self.callback:
+                self.callback(f"Error starting DHT: {str(e)}")
+            return False
+
+    def stop(self):
+        self.running = False
+        if self.socket:
+            try:
+                self.socket.close()
+            except:
+                pass
+        self._pool.shutdown(wait=False)
+
+    def bootstrap(self, addresses: List[Tuple[str, int]]) -> int:
+        """Join the network through known DHT addresses; returns table size"""
+        for address in addresses:
+            self.ping(address)
+        if len(self.table):
+            self.lookup_nodes(self.node_id)
+        return len(self.table)
+
+    def announce(self, content_hash: str):
+        """Advertise that this node holds content_hash"""
+        key = dht_key(content_hash)
+        with self._lock:
+            self._published[key] = content_hash
+        self._store(key)
+
+    def withdraw(self, content_hash: str):
+        """Stop republishing a provider record (it expires elsewhere)"""
+        key = dht_key(content_hash)
+        with self._lock:
+            self._published.pop(key, None)
+            providers = self._records.get(key)
+            if providers is not None:
+                providers.pop(self.peer_id, None)
+                if not providers:
+                    del self._records[key]
+
+    def find_providers(self, content_hash: str) -> List[Dict]:
+        """Find peers holding content_hash: [{peer_id, ip, port}]"""
+        key = dht_key(content_hash)
+        _, values = self._lookup(key, find_value=True)
+        return values
+
+    def find_peer(self, peer_id: str) -> Optional[Dict]:
+        """Find the address of a peer by peer_id"""
+        target = dht_key(peer_id)
+        for contact in self.lookup_nodes(target):
+            if contact.node_id == target:
+                return {'peer_id': contact.peer_id, 'ip': contact.ip, 'port': contact.tcp_port}
+        return None
+
+    def lookup_nodes(self, target: int) -> List[Contact]:
+        """Iteratively find the k nodes closest to target"""
+        contacts, _ = self._lookup(target, find_value=False)
+        return contacts
+
+    def ping(self, address: Tuple[str, int]) -> bool:
+        return self._rpc(address, {'rpc': 'ping'}) is not None
+
+    def _lookup(self, target: int, find_value: bool) -> Tuple[List[Contact], List[Dict]]:
+        """Kademlia node lookup, querying alpha contacts in parallel per round"""
+        shortlist: Dict[int, Contact] = {c.node_id: c for c in self.table.closest(target)}
+        queried = set()
+        failed = set()
+        values: Dict[str, Dict] = {}
+        request = {'rpc': 'find_value' if find_value else 'find_node', 'target': format(target, '040x')}
+
+        while True:
+            live = sorted((c for c in shortlist.values() if c.node_id not in failed),
+                          key=lambda c: c.node_id ^ target)[:self.k]
+            batch = [c for c in live if c.node_id not in queried][:self.alpha]
+            if not batch:
+                break
+            for contact in batch:
+                queried.add(contact.node_id)
+            replies = list(self._pool.map(lambda c: (c, self._rpc(c.address, request)), batch))
+            for contact, reply in replies:
+                if reply is None:
+                    failed.add(contact.node_id)
+                    continue
+                for provider in reply.get('values', []):
+                    if not isinstance(provider, dict) or not isinstance(provider.get('peer_id'), str):
+                        continue
+                    # A node's own record carries no ip; it is the replying node
+                    values[provider['peer_id']] = dict(provider, ip=provider.get('ip') or contact.ip)
+                for data in reply.get('nodes', []):
+                    try:
+                        node = Contact.from_dict(data)
+                    except (KeyError, TypeError, ValueError):
+                        continue  # Malformed or forged contact
+                    if node.node_id != self.node_id and node.node_id not in shortlist:
+                        shortlist[node.node_id] = node
+            if find_value and values:
+                break
+
+        live = sorted((c for c in shortlist.values() if c.node_id not in failed),
+                      key=lambda c: c.node_id ^ target)[:self.k]
+        return live, list(values.values())
+
+    def _store(self, key: int):
+        """Store our provider record on the k nodes closest to key"""
+        provider = {'peer_id': self.peer_id, 'port': self.tcp_port}
+        self._add_record(key, dict(provider, ip=None), own=True)
+        request = {'rpc': 'store', 'key': format(key, '040x'), 'provider': provider}
+        for contact in self.lookup_nodes(key):
+            self._pool.submit(self._rpc, contact.address, request)
+
+    def _add_record(self, key: int, provider: Dict, own: bool = False) -> bool:
+        """Store or refresh a provider record; False if it was dropped for space
+
+        Our own records always fit. Others are refused once max_keys keys
+        or k providers of a key are held, so store RPCs cannot grow memory
+        without bound; a provider already listed can still refresh.
+        """
+        now = time.time()
+        with self._lock:
+            providers = self._records.get(key)
+            if providers is None:
+                if not own and len(self._records) >= self.max_keys:
+                    return False
+                providers = self._records[key] = {}
+            if not own and provider['peer_id'] not in providers and len(providers) >= self.k:
+                for peer_id in [p for p, r in providers.items() if r['expires'] < now]:
+                    del providers[peer_id]
+                if len(providers) >= self.k:
+                    return False
+            providers[provider['peer_id']] = dict(provider, expires=now + self.record_ttl)
+            return True
+
+    def _get_records(self, key: int) -> List[Dict]:
+        now = time.time()
+        with self._lock:
+            providers = self._records.get(key, {})
+            for peer_id in [p for p, r in providers.items() if r['expires'] < now]:
+                del providers[peer_id]
+            return [{'peer_id': r['peer_id'], 'ip': r['ip'], 'port': r['port']}
+                    for r in providers.values()][:self.k]
+
+    def _maintenance_loop(self):
+        """Republish our records and refresh the table around our own id"""
+        next_republish = time.time() + self.republish_interval
+        while self.running:
+            time.sleep(1)
+            if time.time() < next_republish:
+                continue
+            next_republish = time.time() + self.republish_interval
+            try:
+                self.lookup_nodes(self.node_id)
+                with self._lock:
+                    keys = list(self._published)
+                for key in keys:
+                    self._store(key)
+                with self._lock:
+                    now = time.time()
+                    for key in list(self._records):
+                        self._records[key] = {p: r for p, r in self._records[key].items()
+                                              if r['expires'] >= now}
+                        if not self._records[key]:
+                            del self._records[key]
+            except Exception as e:
+                if self.callback:
+                    self.callback(f"DHT maintenance error: {str(e)}")
+
+    def _sender_info(self) -> Dict:
+        return {'node_id': format(self.node_id, '040x'), 'port': self.port,
+                'peer_id': self.peer_id, 'tcp_port': self.tcp_port}
+
+    def _rpc(self, address: Tuple[str, int], message: Dict) -> Optional[Dict]:
+        """Send a request and wait for its reply; None on timeout"""
+        rpc_id = os.urandom(8).hex()
+        event = threading.Event()
+        slot: List = []
+        with self._lock:
+            self._pending[rpc_id] = (event, slot)
+            self.rpcs_sent += 1
+        try:
+            payload = dict(message, id=rpc_id, sender=self._sender_info())
+            self.socket.sendto(json.dumps(payload).encode('utf-8'), address)
+            if not event.wait(self.rpc_timeout):
+                return None
+            return slot[0]
+        except OSError:
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(rpc_id, None)
+
+    def _receive_loop(self):
+        while self.running:
+            try:
+                data, addr = self.socket.recvfrom(65535)
+            except OSError:
+                if not self.running:
+                    break
+                continue
+            try:
+                self._handle_datagram(data, addr)
+            except Exception:
+                continue  # Malformed datagram
+
+    def _handle_datagram(self, data: bytes, addr: Tuple[str, int]):
+        message = json.loads(data.decode('utf-8'))
+        sender = Contact.from_dict(message['sender'], ip=addr[0])
+        self._seen(sender)
+        if message.get('rpc') == 'reply':
+            with self._lock:
+                pending = self._pending.get(message.get('id'))
+            if pending is not None:
+                pending[1].append(message)
+                pending[0].set()
+            return
+        reply = self._handle_request(message, sender)
+        if reply is not None:
+            reply.update(rpc='reply', id=message.get('id'), sender=self._sender_info())
+            try:
+                self.socket.sendto(json.dumps(reply).encode('utf-8'), addr)
+            except OSError:
+                pass
+
+    def _handle_request(self, message: Dict, sender: Contact) -> Optional[Dict]:
+        rpc = message.get('rpc')
+        if rpc == 'ping':
+            return {}
+        if rpc == 'store':
+            provider = message.get('provider', {})
+            if provider.get('peer_id') == sender.peer_id:  # Only store your own records
+                self._add_record(parse_key(message.get('key')),
+                                 {'peer_id': sender.peer_id, 'ip': sender.ip,
+                                  'port': int(provider.get('port', sender.tcp_port))})
+            return {}
+        if rpc in ('find_node', 'find_value'):
+            target = parse_key(message.get('target'))
+            reply = {'nodes': [c.to_dict() for c in self.table.closest(target)]}
+            if rpc == 'find_value':
+                values = self._get_records(target)
+                if values:
+                    reply['values'] = values
+            return reply
+        return None
+
+    def _seen(self, contact: Contact):
+        """Update the routing table, pinging the oldest entry of a full bucket"""
+        oldest = self.table.update(contact)
+        if oldest is not None:
+            def check():
+                if not self.ping(oldest.address):
+                    self.table.replace(oldest, contact)
+            try:
+                self._pool.submit(check)
+            except RuntimeError:
+                pass  # Shutting down
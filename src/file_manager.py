@@ -3,15 +3,21 @@ File Manager - Handles file operations and sharing
 """
 import os
 import shutil
+import threading
 from typing import List, Dict
 from pathlib import Path
 
 
 class FileManager:
-    """Manages files and sharing directories"""
+    """Manages files and sharing directories
     
-    def __init__(self, shared_dir: str):
+    With a ChunkStore, shared files are kept as manifests over the
+    deduplicating store instead of as whole copies.
+    """
+    
+    def __init__(self, shared_dir: str, chunk_store=None):
         self.shared_dir = shared_dir
+        self.chunk_store = chunk_store
         if not os.path.exists(shared_dir):
             os.makedirs(shared_dir)
     
@@ -20,14 +26,36 @@ class FileManager:
         files = []
         try:
             for filename in os.listdir(self.shared_dir):
+                if filename.endswith('.part') or filename.endswith('.tmp'):
+                    continue  # Downloads in progress
                 file_path = os.path.join(self.shared_dir, filename)
-                if os.path.isfile(file_path):
+                if self._is_manifest(filename):
+                    manifest = self.chunk_store.load_manifest(file_path)
+                    if manifest:
+                        files.append({
+                            'name': filename[:-len(self.chunk_store.MANIFEST_SUFFIX)],
+                            'path': file_path,
+                            'size': manifest['size'],
+                            'size_readable': self._format_size(manifest['size']),
+                            'is_dir': False
+                        })
+                elif os.path.isfile(file_path):
                     file_size = os.path.getsize(file_path)
                     files.append({
                         'name': filename,
                         'path': file_path,
                         'size': file_size,
-                        'size_readable': self._format_size(file_size)
+                        'size_readable': self._format_size(file_size),
+                        'is_dir': False
+                    })
+                elif os.path.isdir(file_path):
+                    # Shared folders are listed without walking them
+                    files.append({
+                        'name': filename,
+                        'path': file_path,
+                        'size': 0,
+                        'size_readable': 'Folder',
+                        'is_dir': True
                     })
         except Exception as e:
             print(f"Error reading shared files: {str(e)}")
@@ -43,16 +71,42 @@ class FileManager:
             dest_path = os.path.join(self.shared_dir, file_name)
             
             if os.path.isfile(file_path):
+                if self.chunk_store:
+                    self.chunk_store.share_file(file_path, self.shared_dir, file_name)
+                    return True
                 shutil.copy2(file_path, dest_path)
                 return True
         except Exception as e:
             print(f"Error adding file: {str(e)}")
         return False
     
+    def add_directory_to_share(self, dir_path: str) -> bool:
+        """Add a whole directory tree to the shared directory"""
+        try:
+            if not os.path.isdir(dir_path):
+                return False
+            
+            dir_name = os.path.basename(os.path.normpath(dir_path))
+            dest_path = os.path.join(self.shared_dir, dir_name)
+            shutil.copytree(dir_path, dest_path, dirs_exist_ok=True)
+            return True
+        except Exception as e:
+            print(f"Error adding directory: {str(e)}")
+        return False
+    
     def remove_shared_file(self, file_name: str) -> bool:
-        """Remove a file from shared directory"""
+        """Remove a file or folder from shared directory"""
         try:
             file_path = os.path.join(self.shared_dir, file_name)
+            manifest_path = self._manifest_path(file_name)
+            if manifest_path and os.path.exists(manifest_path):
+                os.remove(manifest_path)
+                # Called from the UI thread; a large store takes a while to scan
+                threading.Thread(target=self._collect_garbage, daemon=True).start()
+                return True
+            if os.path.isdir(file_path):
+                shutil.rmtree(file_path)
+                return True
             if os.path.exists(file_path):
                 os.remove(file_path)
                 return True
@@ -60,10 +114,22 @@ class FileManager:
             print(f"Error removing file: {str(e)}")
         return False
     
+    def _collect_garbage(self):
+        try:
+            self.chunk_store.collect_garbage([self.shared_dir])
+        except Exception as e:
+            print(f"Error collecting chunks: {str(e)}")
+    
     def download_file(self, file_name: str, dest_path: str) -> bool:
         """Download a file from shared directory"""
         try:
             src_path = os.path.join(self.shared_dir, file_name)
+            manifest_path = self._manifest_path(file_name)
+            if manifest_path and os.path.exists(manifest_path):
+                manifest = self.chunk_store.load_manifest(manifest_path)
+                if manifest:
+                    self.chunk_store.materialize(manifest, dest_path)
+                    return True
             if os.path.exists(src_path):
                 shutil.copy2(src_path, dest_path)
                 return True
@@ -71,6 +137,15 @@ class FileManager:
             print(f"Error downloading file: {str(e)}")
         return False
     
+    def _is_manifest(self, file_name: str) -> bool:
+        return bool(self.chunk_store) and file_name.endswith(self.chunk_store.MANIFEST_SUFFIX)
+    
+    def _manifest_path(self, file_name: str):
+        """Path of the manifest a stored file is shared under, if the store is enabled"""
+        if not self.chunk_store:
+            return None
+        return os.path.join(self.shared_dir, file_name + self.chunk_store.MANIFEST_SUFFIX)
+    
     @staticmethod
     def _format_size(size_bytes: int) -> str:
         """Format file size in human readable format"""
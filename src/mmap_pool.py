@@ -0,0 +1,146 @@
+"""
+Mapped File Pool - Shares read-only memory maps of hot files between uploads
+"""
+import mmap
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class _MappedFile:
+    """A single read-only mapping and the number of uploads using it"""
+
+    def __init__(self, path: str, key: Tuple[int, int]):
+        self.path = path
+        self.key = key  # (size, mtime_ns) the mapping was created from
+        self.size = key[0]
+        self.refcount = 0
+        self._file = open(path, 'rb')
+        try:
+            self.map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self._file.close()
+            raise
+
+    def close(self):
+        """Unmap and close the underlying file"""
+        try:
+            self.map.close()
+        except BufferError:
+            pass  # A stray chunk view is still alive; freed with it
+        finally:
+            self._file.close()
+
+
+class MappedFileHandle:
+    """Reference to a pooled mapping, released when the upload finishes"""
+
+    def __init__(self, pool: 'MappedFilePool', entry: _MappedFile):
+        self._pool = pool
+        self._entry = entry
+        self.size = entry.size
+        self.view = memoryview(entry.map)
+
+    def chunk(self, offset: int, length: int) -> memoryview:
+        """Return a zero-copy view of length bytes starting at offset"""
+        return self.view[offset:offset + length]
+
+    def release(self):
+        """Drop this reference; the mapping stays cached for other uploads"""
+        if self._entry is not None:
+            self.view.release()
+            self._pool._release(self._entry)
+            self._entry = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class MappedFilePool:
+    """LRU of shared read-only mmaps, bounded by total mapped bytes
+
+    Every upload of the same file reuses one mapping, so concurrent
+    uploads read from the same page-cache pages instead of each opening
+    the file and copying it through its own buffer. Mappings with no
+    active uploads are evicted least recently used first once the
+    total mapped size exceeds max_mapped_bytes.
+    """
+
+    def __init__(self, max_mapped_bytes: int = 1024 * 1024 * 1024):
+        self.max_mapped_bytes = max_mapped_bytes
+        self.mapped_bytes = 0
+        self._entries: 'OrderedDict[str, _MappedFile]' = OrderedDict()
+        self._stale: Dict[int, _MappedFile] = {}  # replaced but still in use
+        self._lock = threading.Lock()
+
+    def acquire(self, file_path: str) -> Optional[MappedFileHandle]:
+        """Get a shared mapping of file_path, or None if it cannot be mapped"""
+        path = os.path.abspath(file_path)
+        stat = os.stat(path)
+        key = (stat.st_size, stat.st_mtime_ns)
+        if stat.st_size == 0:
+            return None  # Empty files cannot be mapped
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry.key != key:
+                # File changed on disk since it was mapped
+                self._entries.pop(path)
+                self._retire(entry)
+                entry = None
+            if entry is None:
+                entry = _MappedFile(path, key)
+                self._entries[path] = entry
+                self.mapped_bytes += entry.size
+            self._entries.move_to_end(path)
+            entry.refcount += 1
+            self._evict()
+            return MappedFileHandle(self, entry)
+
+    def _release(self, entry: _MappedFile):
+        """Decrement an entry's refcount and trim the pool"""
+        with self._lock:
+            entry.refcount -= 1
+            if entry.refcount == 0 and self._stale.pop(id(entry), None) is not None:
+                self.mapped_bytes -= entry.size
+                entry.close()
+            self._evict()
+
+    def _retire(self, entry: _MappedFile):
+        """Close an entry now, or once its last upload finishes"""
+        if entry.refcount == 0:
+            self.mapped_bytes -= entry.size
+            entry.close()
+        else:
+            self._stale[id(entry)] = entry
+
+    def _evict(self):
+        """Unmap idle entries until the pool fits its byte budget"""
+        if self.mapped_bytes <= self.max_mapped_bytes:
+            return
+        for path in list(self._entries):
+            if self.mapped_bytes <= self.max_mapped_bytes:
+                break
+            entry = self._entries[path]
+            if entry.refcount == 0:
+                del self._entries[path]
+                self.mapped_bytes -= entry.size
+                entry.close()
+
+    def invalidate(self, file_path: str):
+        """Forget the mapping of a file that was removed or replaced"""
+        path = os.path.abspath(file_path)
+        with self._lock:
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self._retire(entry)
+
+    def close(self):
+        """Unmap every idle entry"""
+        with self._lock:
+            for path in list(self._entries):
+                self._retire(self._entries.pop(path))
@@ -0,0 +1,121 @@
+"""
+Peer Exchange - Gossips deltas of the known-peer table between peers
+"""
+import random
+import threading
+import time
+from typing import Dict, List, Set, Tuple
+
+
+class PeerExchange:
+    """Tracks what each neighbour was told and builds compact PEX deltas
+
+    Every exchange carries only the peers added and dropped since the
+    last successful exchange with that neighbour, at most max_entries of
+    each, as [peer_id, ip, port, name] lists. Inbound exchanges are
+    rate-limited per source IP address, not per claimed peer_id, which a
+    sender can change at will: at most INBOUND_BURST per min_interval
+    seconds, so a few nodes behind one address can still gossip. The
+    peers table is shared with other threads, so it is only read through
+    snapshots.
+    """
+
+    INBOUND_BURST = 4         # Inbound exchanges per address per min_interval
+    MAX_TRACKED_ADDRESSES = 4096  # Rate-limit entries kept before idle ones are pruned
+
+    def __init__(self, self_id: str, fanout: int = 3, max_entries: int = 100,
+                 min_interval: float = 5.0, max_failures: int = 3):
+        self.self_id = self_id
+        self.fanout = fanout
+        self.max_entries = max_entries
+        self.min_interval = min_interval
+        self.max_failures = max_failures
+        self._told: Dict[str, Set[str]] = {}         # {neighbour: peer_ids it knows from us}
+        self._learned_from: Dict[str, str] = {}      # {peer_id: neighbour that told us}
+        self._inbound: Dict[str, List[float]] = {}  # {address: recent inbound exchange times}
+        self._failures: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def pick_targets(self, peers: Dict[str, Dict]) -> List[str]:
+        """Choose up to fanout random neighbours for this round"""
+        candidates = [peer_id for peer_id in list(peers) if peer_id != self.self_id]
+        return random.sample(candidates, min(self.fanout, len(candidates)))
+
+    def build_delta(self, neighbour: str, peers: Dict[str, Dict]) -> Tuple[List[List], List[str]]:
+        """Peers added and dropped since we last told neighbour"""
+        with self._lock:
+            told = self._told.get(neighbour, set())
+        snapshot = dict(list(peers.items()))
+        current = {peer_id for peer_id in snapshot if peer_id != neighbour}
+        unsent = list(current - told)
+        # A random pick, so capped deltas from different nodes spread different peers
+        if len(unsent) > self.max_entries:
+            unsent = random.sample(unsent, self.max_entries)
+        added = []
+        for peer_id in unsent:
+            info = snapshot[peer_id]
+            added.append([peer_id, info['ip'], info['port'], info.get('name', 'Unknown')])
+        dropped = list(told - current)[:self.max_entries]
+        return added, dropped
+
+    def mark_sent(self, neighbour: str, added: List[List], dropped: List[str]):
+        """Record a delta as delivered so it is not repeated"""
+        with self._lock:
+            told = self._told.setdefault(neighbour, set())
+            told.update(entry[0] for entry in added)
+            told.difference_update(dropped)
+
+    def apply_delta(self, neighbour: str, added: List[List], dropped: List[str],
+                    peers: Dict[str, Dict]) -> int:
+        """Merge a received delta into peers; returns how many peers were new"""
+        new = 0
+        with self._lock:
+            # The neighbour knows what it told us, so never send those back
+            told = self._told.setdefault(neighbour, set())
+            for entry in added[:self.max_entries]:
+                try:
+                    peer_id, ip, port, name = entry[0], entry[1], int(entry[2]), entry[3]
+                except (IndexError, TypeError, ValueError):
+                    continue
+                if not isinstance(peer_id, str) or peer_id == self.self_id:
+                    continue
+                told.add(peer_id)
+                if peer_id in peers:
+                    continue
+                peers[peer_id] = {'ip': ip, 'port': port, 'name': name}
+                self._learned_from[peer_id] = neighbour
+                new += 1
+            # Only forget peers this neighbour told us about in the first place
+            for peer_id in dropped[:self.max_entries]:
+                if self._learned_from.get(peer_id) == neighbour:
+                    peers.pop(peer_id, None)
+                    del self._learned_from[peer_id]
+        return new
+
+    def allow_inbound(self, address: str) -> bool:
+        """Rate-limit exchanges initiated from one IP address"""
+        now = time.monotonic()
+        with self._lock:
+            recent = [t for t in self._inbound.get(address, []) if now - t < self.min_interval]
+            if len(recent) >= self.INBOUND_BURST:
+                self._inbound[address] = recent
+                return False
+            recent.append(now)
+            self._inbound[address] = recent
+            if len(self._inbound) > self.MAX_TRACKED_ADDRESSES:
+                self._inbound = {a: times for a, times in self._inbound.items()
+                                 if now - times[-1] < self.min_interval}
+            return True
+
+    def record_result(self, neighbour: str, ok: bool, peers: Dict[str, Dict]):
+        """Count failed exchanges; drop a neighbour after max_failures in a row"""
+        with self._lock:
+            if ok:
+                self._failures.pop(neighbour, None)
+                return
+            self._failures[neighbour] = self._failures.get(neighbour, 0) + 1
+            if self._failures[neighbour] >= self.max_failures:
+                del self._failures[neighbour]
+                peers.pop(neighbour, None)
+                self._told.pop(neighbour, None)
+                self._learned_from.pop(neighbour, None)
@@ -0,0 +1,136 @@
+"""
+Receive Pipeline - Write-behind disk stage for incoming file transfers
+"""
+import errno
+import os
+import queue
+import threading
+from typing import List, Optional
+
+
+class WriteBehindFile:
+    """Writes received buffers to disk on a dedicated writer thread
+
+    The network thread only hands buffers to a bounded queue, so socket
+    reads overlap with disk writes and stall only when the disk falls
+    queue_depth buffers behind. The target file is preallocated to its
+    final size, consecutive buffers are coalesced into one vectored
+    write of up to batch_bytes, and fsync runs only every
+    checkpoint_bytes and when the file is closed.
+    """
+
+    MAX_BATCH_BUFFERS = 512  # Stay below IOV_MAX for pwritev
+
+    def __init__(self, file_path: str, file_size: int, queue_depth: int = 64,
+                 batch_bytes: int = 1024 * 1024, checkpoint_bytes: int = 64 * 1024 * 1024):
+        self.file_path = file_path
+        self.file_size = file_size
+        self.batch_bytes = batch_bytes
+        self.checkpoint_bytes = checkpoint_bytes
+        self.bytes_queued = 0
+        self.bytes_written = 0
+        self._queue: 'queue.Queue[Optional[bytes]]' = queue.Queue(maxsize=queue_depth)
+        self._error: Optional[BaseException] = None
+        self._fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        try:
+            self._preallocate()
+        except Exception:
+            os.close(self._fd)
+            raise
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _preallocate(self):
+        """Reserve the full file size up front to avoid fragmentation"""
+        if self.file_size <= 0:
+            return
+        if hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(self._fd, 0, self.file_size)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                    raise  # ENOSPC and real I/O errors must reject the transfer
+                # Filesystem without fallocate support
+        os.ftruncate(self._fd, self.file_size)
+
+    def write(self, data: bytes):
+        """Queue the next sequential buffer, blocking while the queue is full"""
+        if self._error is not None:
+            raise self._error
+        self._queue.put(data)
+        self.bytes_queued += len(data)
+
+    def close(self, complete: bool = True):
+        """Drain the queue, sync to disk and stop the writer thread
+
+        If the transfer was cut short the file is truncated to the bytes
+        actually received instead of keeping the preallocated tail.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        try:
+            if self._error is None:
+                if not complete or self.bytes_written != self.file_size:
+                    os.ftruncate(self._fd, self.bytes_written)
+                os.fsync(self._fd)
+        finally:
+            os.close(self._fd)
+        if self._error is not None:
+            raise self._error
+
+    def _run(self):
+        """Writer thread: coalesce queued buffers into large writes"""
+        since_checkpoint = 0
+        stopping = False
+        while not stopping:
+            data = self._queue.get()
+            if data is None:
+                return
+            batch = [data]
+            batch_len = len(data)
+            while batch_len < self.batch_bytes and len(batch) < self.MAX_BATCH_BUFFERS:
+                try:
+                    data = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if data is None:
+                    stopping = True
+                    break
+                batch.append(data)
+                batch_len += len(data)
+
+            # After a failure keep draining so the network thread never blocks
+            if self._error is None:
+                try:
+                    self._write_batch(batch, batch_len)
+                    since_checkpoint += batch_len
+                    if since_checkpoint >= self.checkpoint_bytes:
+                        os.fsync(self._fd)
+                        since_checkpoint = 0
+                except BaseException as e:
+                    self._error = e
+
+    def _write_batch(self, batch: List[bytes], batch_len: int):
+        """Write a batch at the current offset, retrying short writes"""
+        offset = self.bytes_written
+        if hasattr(os, 'pwritev'):
+            written = os.pwritev(self._fd, batch, offset)
+            if written < batch_len:
+                remaining = b''.join(batch)[written:]
+                self._write_all(remaining, offset + written)
+        else:
+            self._write_all(b''.join(batch), offset)
+        self.bytes_written = offset + batch_len
+
+    def _write_all(self, data: bytes, offset: int):
+        """Write data at offset with pwrite, or lseek+write where unavailable"""
+        view = memoryview(data)
+        while view:
+            if hasattr(os, 'pwrite'):
+                written = os.pwrite(self._fd, view, offset)
+            else:
+                os.lseek(self._fd, offset, os.SEEK_SET)
+                written = os.write(self._fd, view)
+            view = view[written:]
+            offset += written
@@ -0,0 +1,297 @@
+"""
+Secure Transport - TLS for peer connections with pinned self-signed identities
+"""
+import hashlib
+import json
+import os
+import shutil
+import socket
+import ssl
+import struct
+import subprocess
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+TLS_HANDSHAKE_RECORD = 0x16  # First byte of a TLS ClientHello
+CLIENT_CERT_RECORD = 0x01    # First byte of a client's certificate announcement
+CLIENT_CERT_HEADER = struct.Struct('!BH')  # (CLIENT_CERT_RECORD, DER length)
+MAX_CLIENT_CERT = 4096       # Largest announced client certificate, in DER bytes
+PEER_ID_DIGITS = 32          # A peer_id is the first 128 bits of the certificate fingerprint
+MAX_PLAINTEXT_REPLY = 4096   # Bytes read back from a peer that answered TLS in plaintext
+PLAINTEXT_REPLY_TIMEOUT = 1.0  # Seconds to wait for the rest of such a reply
+
+
+class PlaintextReplyError(ssl.SSLError):
+    """The peer answered our TLS handshake with a plaintext message (reply)"""
+
+    def __init__(self, reply: str):
+        super().__init__(f"Peer replied in plaintext: {reply[:100]}")
+        self.reply = reply
+
+
+class PeerIdentity:
+    """This node's self-signed certificate; its peer_id derives from the cert"""
+
+    def __init__(self, cert_file: str, key_file: str):
+        self.cert_file = cert_file
+        self.key_file = key_file
+        with open(cert_file) as f:
+            der = ssl.PEM_cert_to_DER_cert(f.read())
+        self.der = der
+        self.fingerprint = hashlib.sha256(der).hexdigest()
+        self.peer_id = self.fingerprint[:PEER_ID_DIGITS]
+
+    @classmethod
+    def load_or_create(cls, identity_dir: str) -> 'PeerIdentity':
+        """Load the identity in identity_dir, generating one on first use"""
+        cert_file = os.path.join(identity_dir, 'peer_cert.pem')
+        key_file = os.path.join(identity_dir, 'peer_key.pem')
+        if not (os.path.exists(cert_file) and os.path.exists(key_file)):
+            # The standard library cannot create certificates, so use the openssl tool
+            openssl = shutil.which('openssl')
+            if openssl is None:
+                raise RuntimeError("openssl is required to create a peer identity")
+            os.makedirs(identity_dir, exist_ok=True)
+            subprocess.run(
+                [openssl, 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1',
+                 '-nodes', '-keyout', key_file, '-out', cert_file, '-days', '3650',
+                 '-subj', '/CN=p2p-file-share-peer'],
+                check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+            )
+            try:
+                os.chmod(key_file, 0o600)
+            except OSError:
+                pass
+        return cls(cert_file, key_file)
+
+
+class SecureTransport:
+    """Wraps peer sockets in TLS with session resumption and identity pinning
+
+    Peers use self-signed certificates, so CA validation is replaced by
+    pinning: a peer_id is the first 32 hex digits of its certificate's
+    SHA-256, and the full fingerprint is remembered on first contact
+    (known_peers_file), so a different certificate claiming a known
+    peer_id is rejected. Both sides authenticate: a client announces its
+    certificate in the clear before the ClientHello, and the server
+    answers with a context that trusts exactly that certificate and
+    requires it, so the handshake proves the client holds its key.
+    Client sessions are cached per address and offered on reconnect, so
+    repeat connections skip the full handshake. With require_tls, inbound
+    plaintext connections are refused outright.
+    Cipher suites are limited to ECDHE with AES-GCM, which runs on the
+    AES-NI/PCLMUL units of current CPUs.
+    """
+
+    CIPHERS = 'ECDHE+AESGCM'
+    MAX_CLIENT_CONTEXTS = 64  # Server contexts kept for recently seen client certificates
+
+    def __init__(self, identity_dir: str, known_peers_file: Optional[str] = None,
+                 require_tls: bool = True):
+        self.identity = PeerIdentity.load_or_create(identity_dir)
+        self.known_peers_file = known_peers_file
+        self.require_tls = require_tls
+        self._pins: Dict[str, str] = {}  # {peer_id: certificate fingerprint}
+        self._sessions: Dict[Tuple[str, int], ssl.SSLSession] = {}
+        self._client_contexts: 'OrderedDict[bytes, ssl.SSLContext]' = OrderedDict()  # {client cert: context}
+        self._lock = threading.Lock()
+        self._load_pins()
+
+        self.server_context = self._make_server_context()  # For clients that announce no certificate
+
+        self.client_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        self.client_context.minimum_version = ssl.TLSVersion.TLSv1_2
+        self.client_context.set_ciphers(self.CIPHERS)
+        self.client_context.load_cert_chain(self.identity.cert_file, self.identity.key_file)
+        # Self-signed peers: authenticity comes from the pinned fingerprint instead
+        self.client_context.check_hostname = False
+        self.client_context.verify_mode = ssl.CERT_NONE
+        self._announcement = CLIENT_CERT_HEADER.pack(CLIENT_CERT_RECORD, len(self.identity.der)) + self.identity.der
+
+    @property
+    def peer_id(self) -> str:
+        return self.identity.peer_id
+
+    def accept(self, client_socket):
+        """Wrap an accepted socket if the peer opened with TLS
+
+        A peer that announced its certificate must prove it in the
+        handshake. Plaintext peers are refused under require_tls;
+        otherwise they are served so nodes with encryption off can still
+        handshake and exchange peers, but never transfer data (see
+        is_encrypted) and may not claim a pinned peer_id (see verify_claim).
+        """
+        first = client_socket.recv(1, socket.MSG_PEEK)
+        if first and first[0] == CLIENT_CERT_RECORD:
+            _, length = CLIENT_CERT_HEADER.unpack(self._recv_exact(client_socket, CLIENT_CERT_HEADER.size))
+            if not 0 < length <= MAX_CLIENT_CERT:
+                raise ssl.SSLError(f"Client certificate announcement of {length} bytes")
+            context = self._client_context(self._recv_exact(client_socket, length))
+            return context.wrap_socket(client_socket, server_side=True)
+        if first and first[0] == TLS_HANDSHAKE_RECORD:
+            return self.server_context.wrap_socket(client_socket, server_side=True)
+        if self.require_tls:
+            raise ssl.SSLError("Plaintext connection refused, TLS is required")
+        return client_socket
+
+    @staticmethod
+    def is_encrypted(sock) -> bool:
+        return isinstance(sock, ssl.SSLSocket)
+
+    def connect(self, sock, address: Tuple[str, int], expected_peer_id: Optional[str] = None):
+        """Run the client TLS handshake on a connected socket, resuming if possible"""
+        with self._lock:
+            session = self._sessions.get(address)
+        sock.sendall(self._announcement)
+        tls_sock = self.client_context.wrap_socket(sock, session=session, do_handshake_on_connect=False)
+        try:
+            tls_sock.do_handshake()
+        except ssl.SSLError:
+            # Never offer a ticket again after a failed handshake with it
+            with self._lock:
+                self._sessions.pop(address, None)
+            reply = self._plaintext_reply(tls_sock)
+            tls_sock.close()
+            if reply:
+                raise PlaintextReplyError(reply) from None
+            raise
+        except Exception:
+            tls_sock.close()
+            raise
+        try:
+            self.verify_peer(tls_sock, expected_peer_id)
+        except Exception:
+            tls_sock.close()
+            raise
+        return tls_sock
+
+    @staticmethod
+    def _plaintext_reply(tls_sock) -> str:
+        """Read what follows a failed handshake if the peer spoke plaintext
+
+        A busy peer answers before reading our ClientHello; the record
+        layer consumes only a record header of its reply, so the rest is
+        still in the socket, readable beneath TLS.
+        """
+        data = b''
+        try:
+            tls_sock.settimeout(PLAINTEXT_REPLY_TIMEOUT)
+            while len(data) < MAX_PLAINTEXT_REPLY:
+                more = socket.socket.recv(tls_sock, MAX_PLAINTEXT_REPLY - len(data))
+                if not more:
+                    break
+                data += more
+        except OSError:
+            pass
+        return data.decode('utf-8', 'replace').strip()
+
+    def remember_session(self, tls_sock, address: Tuple[str, int]):
+        """Keep the session ticket of a finished exchange for the next connect
+
+        TLS 1.3 tickets arrive after the handshake, so call this once the
+        peer's reply has been read.
+        """
+        if not isinstance(tls_sock, ssl.SSLSocket):
+            return
+        session = tls_sock.session
+        if session is not None and session.has_ticket:
+            with self._lock:
+                self._sessions[address] = session
+
+    def verify_peer(self, tls_sock, expected_peer_id: Optional[str] = None) -> str:
+        """Check the peer certificate against its peer_id and the pin store"""
+        if not isinstance(tls_sock, ssl.SSLSocket):
+            return expected_peer_id
+        der = tls_sock.getpeercert(binary_form=True)
+        if der is None:
+            raise ssl.SSLError("Peer presented no certificate")
+        fingerprint = hashlib.sha256(der).hexdigest()
+        peer_id = fingerprint[:PEER_ID_DIGITS]
+        if expected_peer_id is not None and expected_peer_id != peer_id:
+            raise ssl.SSLError(f"Certificate does not belong to peer {expected_peer_id}")
+        with self._lock:
+            pinned = self._pins.get(peer_id)
+            if pinned is None:
+                self._pins[peer_id] = fingerprint
+            elif pinned != fingerprint:
+                raise ssl.SSLError(f"Certificate for peer {peer_id} does not match the pinned one")
+        if pinned is None:
+            self._save_pins()
+        return peer_id
+
+    def verify_claim(self, sock, claimed_peer_id: str):
+        """Check a peer_id an inbound peer claims in a control message
+
+        A certificate-authenticated peer may only claim its own peer_id.
+        Plaintext and anonymous TLS peers stay unauthenticated, but may
+        not claim a peer_id we hold a pinned certificate for.
+        """
+        if isinstance(sock, ssl.SSLSocket) and sock.getpeercert(binary_form=True) is not None:
+            if self.verify_peer(sock) != claimed_peer_id:
+                raise ssl.SSLError(f"Certificate does not belong to peer {claimed_peer_id}")
+            return
+        with self._lock:
+            pinned = claimed_peer_id in self._pins
+        if pinned:
+            raise ssl.SSLError(f"Peer {claimed_peer_id} did not authenticate with its certificate")
+
+    def _make_server_context(self, client_der: bytes = None) -> ssl.SSLContext:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.minimum_version = ssl.TLSVersion.TLSv1_2
+        context.set_ciphers(self.CIPHERS)
+        context.load_cert_chain(self.identity.cert_file, self.identity.key_file)
+        if client_der is not None:
+            # Trusting only the announced certificate turns chain validation
+            # into proof that the client holds its key
+            context.load_verify_locations(cadata=client_der)
+            context.verify_mode = ssl.CERT_REQUIRED
+        return context
+
+    def _client_context(self, client_der: bytes) -> ssl.SSLContext:
+        """Server context for one client certificate, reused so its tickets resume"""
+        with self._lock:
+            context = self._client_contexts.get(client_der)
+            if context is not None:
+                self._client_contexts.move_to_end(client_der)
+                return context
+        context = self._make_server_context(client_der)
+        with self._lock:
+            self._client_contexts[client_der] = context
+            if len(self._client_contexts) > self.MAX_CLIENT_CONTEXTS:
+                self._client_contexts.popitem(last=False)
+        return context
+
+    @staticmethod
+    def _recv_exact(sock, size: int) -> bytes:
+        data = b''
+        while len(data) < size:
+            more = sock.recv(size - len(data))
+            if not more:
+                raise ConnectionError("Connection closed during the certificate announcement")
+            data += more
+        return data
+
+    def _load_pins(self):
+        """Load fingerprints pinned in earlier sessions"""
+        if not self.known_peers_file or not os.path.exists(self.known_peers_file):
+            return
+        try:
+            with open(self.known_peers_file) as f:
+                self._pins.update(json.load(f))
+        except Exception as e:
+            print(f"Error loading known peers: {str(e)}")
+
+    def _save_pins(self):
+        """Persist pinned fingerprints"""
+        if not self.known_peers_file:
+            return
+        with self._lock:
+            pins = dict(self._pins)
+        try:
+            tmp_path = self.known_peers_file + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(pins, f, indent=2)
+            os.replace(tmp_path, self.known_peers_file)
+        except OSError as e:
+            print(f"Error saving known peers: {str(e)}")
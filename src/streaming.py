@@ -0,0 +1,302 @@
+"""
+Streaming - Sequential downloads with read-ahead and a local HTTP range server
+"""
+import mimetypes
+import os
+import re
+import struct
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+from urllib.parse import quote, unquote
+
+RANGE_REQUEST = struct.Struct('!QI')  # (offset, length) of one chunk request
+
+MISSING, REQUESTED, PRESENT = 0, 1, 2
+
+
+def read_range_request(sock):
+    """Read the next (offset, length) request, or None when the peer is done"""
+    data = b''
+    while len(data) < RANGE_REQUEST.size:
+        more = sock.recv(RANGE_REQUEST.size - len(data))
+        if not more:
+            return None
+        data += more
+    return RANGE_REQUEST.unpack(data)
+
+
+class StreamingDownload:
+    """Downloads a file chunk by chunk in playback order
+
+    Up to read_ahead chunk requests are kept in flight on one
+    connection, always for the first missing chunks at or after the
+    playhead. read() moves the playhead to the offset a player asks for,
+    so a seek is served next instead of after the rest of the file;
+    once everything after the playhead is here, the fetcher wraps around
+    to fill the gaps before it. Data is written to file_path as it
+    arrives and can be read back before the download completes.
+    """
+
+    def __init__(self, sock, file_path: str, file_size: int, chunk_size: int = 256 * 1024,
+                 read_ahead: int = 8, on_progress: Callable = None, on_complete: Callable = None):
+        self.sock = sock
+        self.file_path = file_path
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+        self.read_ahead = max(1, read_ahead)
+        self.on_progress = on_progress  # Called with the byte count of each chunk
+        self.on_complete = on_complete  # Called with this download when it finishes or fails
+        self.chunk_count = (file_size + chunk_size - 1) // chunk_size
+        self.received = 0
+        self.complete = file_size == 0
+        self.error: Optional[BaseException] = None
+        self.remove_on_close = False  # Set once the data lives elsewhere (e.g. a chunk store)
+        self._state = bytearray(self.chunk_count)
+        self._playhead = 0
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()  # Serializes the lseek fallback and close() with readers
+        self._fd = os.open(file_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        os.ftruncate(self._fd, file_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def read(self, offset: int, length: int, timeout: float = None) -> Optional[bytes]:
+        """Return up to length bytes at offset, waiting for them if needed
+
+        Returns the longest run of downloaded bytes starting at offset,
+        b'' at the end of the file, or None if nothing arrived in time.
+        """
+        if offset >= self.file_size:
+            return b''
+        index = offset // self.chunk_size
+        with self._cond:
+            self._playhead = index  # Prioritize what the player asked for
+            if not self._cond.wait_for(lambda: self._state[index] == PRESENT or self.error is not None,
+                                       timeout):
+                return None
+            if self._state[index] != PRESENT:
+                return None
+            end = index
+            limit = min(self.chunk_count, (offset + length - 1) // self.chunk_size + 1)
+            while end < limit and self._state[end] == PRESENT:
+                end += 1
+        available = min(offset + length, end * self.chunk_size, self.file_size) - offset
+        return self._read_at(available, offset)
+
+    def install(self, file_path: str):
+        """Move the finished file to file_path and keep serving it from there
+
+        The descriptor is closed across the rename, since Windows cannot
+        rename or replace an open file, and reopened read-only afterwards.
+        """
+        with self._io_lock:
+            if self._fd is None:
+                raise ConnectionError("Stream closed")
+            os.close(self._fd)
+            try:
+                os.replace(self.file_path, file_path)
+                self.file_path = file_path
+            finally:
+                self._fd = os.open(self.file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+
+    def close(self):
+        """Stop the download and release the file, deleting it if remove_on_close"""
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        if threading.current_thread() is not self._thread:
+            self._thread.join(timeout=5)
+        with self._io_lock:
+            if self._fd is not None:
+                try:
+                    os.close(self._fd)
+                except OSError:
+                    pass
+                self._fd = None
+            if self.remove_on_close:
+                try:
+                    os.remove(self.file_path)
+                except OSError:
+                    pass
+
+    def _read_at(self, length: int, offset: int) -> bytes:
+        """Read at offset with pread, or lseek+read where unavailable"""
+        with self._io_lock:
+            if self._fd is None:
+                raise ConnectionError("Stream closed")
+            if hasattr(os, 'pread'):
+                return os.pread(self._fd, length, offset)
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            return os.read(self._fd, length)
+
+    def _write_at(self, data: bytes, offset: int):
+        """Write all of data at offset with pwrite, or lseek+write where unavailable"""
+        view = memoryview(data)
+        with self._io_lock:
+            if self._fd is None:
+                raise ConnectionError("Stream closed")
+            while view:
+                if hasattr(os, 'pwrite'):
+                    written = os.pwrite(self._fd, view, offset)
+                else:
+                    os.lseek(self._fd, offset, os.SEEK_SET)
+                    written = os.write(self._fd, view)
+                view = view[written:]
+                offset += written
+
+    def _next_wanted(self) -> int:
+        """First missing chunk at or after the playhead, wrapping around"""
+        index = self._state.find(MISSING, self._playhead)
+        if index < 0:
+            index = self._state.find(MISSING)
+        return index
+
+    def _run(self):
+        in_flight = []
+        try:
+            while True:
+                with self._cond:
+                    while len(in_flight) < self.read_ahead:
+                        index = self._next_wanted()
+                        if index < 0:
+                            break
+                        self._state[index] = REQUESTED
+                        in_flight.append(index)
+                        offset = index * self.chunk_size
+                        self.sock.sendall(RANGE_REQUEST.pack(
+                            offset, min(self.chunk_size, self.file_size - offset)))
+                if not in_flight:
+                    break
+                index = in_flight.pop(0)
+                offset = index * self.chunk_size
+                data = self._recv_exact(min(self.chunk_size, self.file_size - offset))
+                self._write_at(data, offset)
+                with self._cond:
+                    self._state[index] = PRESENT
+                    self.received += len(data)
+                    self._cond.notify_all()
+                if self.on_progress:
+                    self.on_progress(len(data))
+            self.complete = True
+        except Exception as e:
+            with self._cond:
+                self.error = e
+                self._cond.notify_all()
+        finally:
+            try:
+                self.sock.close()  # The server sees EOF and ends the stream
+            except OSError:
+                pass
+            if self.on_complete:
+                self.on_complete(self)
+
+    def _recv_exact(self, size: int) -> bytes:
+        data = bytearray(size)
+        view = memoryview(data)
+        received = 0
+        while received < size:
+            n = self.sock.recv_into(view[received:])
+            if not n:
+                raise ConnectionError(f"Stream ended after {received}/{size} bytes of a chunk")
+            received += n
+        return bytes(data)
+
+
+class StreamServer:
+    """Local HTTP server exposing streaming downloads to media players
+
+    Each download is served at http://host:port/<name> with support for
+    Range requests. Missing data is waited for at most wait_timeout
+    seconds per piece, during which the download fetches it first.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, wait_timeout: float = 10.0):
+        self.wait_timeout = wait_timeout
+        self.downloads: Dict[str, StreamingDownload] = {}
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.host, self.port = self._httpd.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def add(self, name: str, download: StreamingDownload) -> str:
+        """Publish a download and return its URL"""
+        self.downloads[name] = download
+        return f"http://{self.host}:{self.port}/{quote(name)}"
+
+    def remove(self, name: str, download: StreamingDownload = None):
+        """Unpublish name, or only if it still serves download when given"""
+        if download is None or self.downloads.get(name) is download:
+            self.downloads.pop(name, None)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_HEAD(self):
+                self._serve(send_body=False)
+
+            def do_GET(self):
+                self._serve(send_body=True)
+
+            def _serve(self, send_body: bool):
+                name = unquote(self.path.lstrip('/').split('?', 1)[0])
+                download = server.downloads.get(name)
+                if download is None:
+                    self.send_error(404)
+                    return
+                size = download.file_size
+                start, end = 0, size - 1
+                match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range', ''))
+                if match and (match.group(1) or match.group(2)):
+                    if match.group(1):
+                        start = int(match.group(1))
+                        if match.group(2):
+                            end = min(int(match.group(2)), size - 1)
+                    else:
+                        start = max(0, size - int(match.group(2)))  # Suffix range
+                    if start >= size or start > end:
+                        self.send_response(416)
+                        self.send_header('Content-Range', f"bytes */{size}")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f"bytes {start}-{end}/{size}")
+                else:
+                    self.send_response(200)
+                content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(max(0, end - start + 1)))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.end_headers()
+                if not send_body:
+                    return
+                position = start
+                try:
+                    while position <= end:
+                        data = download.read(position, min(download.chunk_size, end + 1 - position),
+                                             server.wait_timeout)
+                        if not data:
+                            break  # Timed out; the player will retry the range
+                        self.wfile.write(data)
+                        position += len(data)
+                except (ConnectionError, OSError):
+                    pass  # Player closed the connection or seeked elsewhere
+                if position <= end:
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass  # Keep players' request noise out of the activity log
+
+        return Handler
@@ -0,0 +1,181 @@
+"""
+Transfer Tuner - Adapts chunk and socket buffer sizes to each peer's link
+"""
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, Optional
+
+
+class PeerTuning:
+    """Measured link state and the transfer parameters chosen for one peer"""
+
+    def __init__(self, chunk_size: int, socket_buffer: int, pipeline_depth: int,
+                 rtt: float = 0.0, goodput: float = 0.0):
+        self.chunk_size = chunk_size
+        self.socket_buffer = socket_buffer
+        self.pipeline_depth = pipeline_depth
+        self.rtt = rtt            # Smoothed round-trip time in seconds
+        self.goodput = goodput    # Smoothed application throughput in bytes/s
+
+    def to_dict(self) -> Dict:
+        return {
+            'chunk_size': self.chunk_size,
+            'socket_buffer': self.socket_buffer,
+            'pipeline_depth': self.pipeline_depth,
+            'rtt': self.rtt,
+            'goodput': self.goodput,
+        }
+
+
+class TransferTuner:
+    """Per-peer RTT/goodput measurement and bounded parameter selection
+
+    Socket buffers are sized to twice the bandwidth-delay product so a
+    single connection can fill fast links. The application chunk size
+    is set so that one chunk takes about TARGET_CHUNK_SECONDS to
+    transfer, and the pipeline depth is set so the chunks in flight
+    cover the socket buffer. Every value is clamped to its bounds and
+    rounded to a power of two. The chosen values are saved to
+    state_file so later sessions start from them.
+    """
+
+    SMOOTHING = 0.25              # Weight of a new sample in the moving averages
+    TARGET_CHUNK_SECONDS = 0.005  # Transfer time one chunk should take
+    SAMPLE_INTERVAL = 0.25        # Seconds between in-transfer re-tunes
+
+    def __init__(self, initial_chunk_size: int = 64 * 1024, min_chunk_size: int = 4096,
+                 max_chunk_size: int = 1024 * 1024, min_socket_buffer: int = 64 * 1024,
+                 max_socket_buffer: int = 8 * 1024 * 1024, min_pipeline_depth: int = 4,
+                 max_pipeline_depth: int = 256, state_file: Optional[str] = None):
+        self.initial_chunk_size = initial_chunk_size
+        self.min_chunk_size = min_chunk_size
+        self.max_chunk_size = max_chunk_size
+        self.min_socket_buffer = min_socket_buffer
+        self.max_socket_buffer = max_socket_buffer
+        self.min_pipeline_depth = min_pipeline_depth
+        self.max_pipeline_depth = max_pipeline_depth
+        self.state_file = state_file
+        self._peers: Dict[str, PeerTuning] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def get(self, peer: str) -> PeerTuning:
+        """Get the current parameters for a peer, creating defaults if new"""
+        with self._lock:
+            tuning = self._peers.get(peer)
+            if tuning is None:
+                tuning = PeerTuning(
+                    self._clamp(self.initial_chunk_size, self.min_chunk_size, self.max_chunk_size),
+                    self._clamp(4 * self.initial_chunk_size, self.min_socket_buffer, self.max_socket_buffer),
+                    self._clamp(16, self.min_pipeline_depth, self.max_pipeline_depth),
+                )
+                self._peers[peer] = tuning
+            return tuning
+
+    def observe_rtt(self, peer: str, seconds: float) -> PeerTuning:
+        """Fold a round-trip sample (e.g. TCP connect or request/reply) in"""
+        tuning = self.get(peer)
+        with self._lock:
+            tuning.rtt = self._smooth(tuning.rtt, seconds)
+            self._retune(tuning)
+        return tuning
+
+    def observe_transfer(self, peer: str, num_bytes: int, seconds: float) -> PeerTuning:
+        """Fold a goodput sample in and re-derive the peer's parameters"""
+        tuning = self.get(peer)
+        if num_bytes <= 0 or seconds <= 0:
+            return tuning
+        with self._lock:
+            tuning.goodput = self._smooth(tuning.goodput, num_bytes / seconds)
+            self._retune(tuning)
+        return tuning
+
+    def apply(self, sock, tuning: PeerTuning):
+        """Set SO_SNDBUF/SO_RCVBUF on a socket from a peer's parameters"""
+        for option in (socket.SO_SNDBUF, socket.SO_RCVBUF):
+            try:
+                sock.setsockopt(socket.SOL_SOCKET, option, tuning.socket_buffer)
+            except OSError:
+                pass  # The OS may cap or refuse the size
+
+    def save(self):
+        """Record the chosen parameters for every peer"""
+        if not self.state_file:
+            return
+        with self._lock:
+            state = {peer: tuning.to_dict() for peer, tuning in self._peers.items()}
+        try:
+            tmp_path = self.state_file + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f, indent=2)
+            os.replace(tmp_path, self.state_file)
+        except OSError as e:
+            print(f"Error saving transfer tuning: {str(e)}")
+
+    def _load(self):
+        """Start from the parameters recorded in a previous session"""
+        if not self.state_file or not os.path.exists(self.state_file):
+            return
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+            for peer, values in state.items():
+                tuning = PeerTuning(**values)
+                self._retune(tuning)
+                self._peers[peer] = tuning
+        except Exception as e:
+            print(f"Error loading transfer tuning: {str(e)}")
+
+    def _retune(self, tuning: PeerTuning):
+        """Derive chunk size, socket buffers and pipeline depth from measurements"""
+        if tuning.goodput > 0:
+            tuning.chunk_size = self._clamp(tuning.goodput * self.TARGET_CHUNK_SECONDS,
+                                            self.min_chunk_size, self.max_chunk_size)
+            if tuning.rtt > 0:
+                tuning.socket_buffer = self._clamp(2 * tuning.goodput * tuning.rtt,
+                                                   self.min_socket_buffer, self.max_socket_buffer)
+        tuning.pipeline_depth = self._clamp(tuning.socket_buffer // tuning.chunk_size,
+                                            self.min_pipeline_depth, self.max_pipeline_depth)
+
+    def _smooth(self, current: float, sample: float) -> float:
+        if current <= 0:
+            return sample
+        return (1 - self.SMOOTHING) * current + self.SMOOTHING * sample
+
+    @staticmethod
+    def _clamp(value: float, low: int, high: int) -> int:
+        """Round down to a power of two within [low, high]"""
+        value = max(low, min(high, int(value)))
+        return max(low, 1 << (value.bit_length() - 1))
+
+
+class TransferMeter:
+    """Feeds periodic goodput samples of one transfer to the tuner"""
+
+    def __init__(self, tuner: TransferTuner, peer: str):
+        self.tuner = tuner
+        self.peer = peer
+        self.tuning = tuner.get(peer)
+        self._bytes = 0
+        self._since = time.monotonic()
+
+    def add(self, num_bytes: int) -> bool:
+        """Count transferred bytes; returns True when the tuning was updated"""
+        self._bytes += num_bytes
+        elapsed = time.monotonic() - self._since
+        if elapsed < TransferTuner.SAMPLE_INTERVAL:
+            return False
+        self.tuning = self.tuner.observe_transfer(self.peer, self._bytes, elapsed)
+        self._bytes = 0
+        self._since = time.monotonic()
+        return True
+
+    def finish(self):
+        """Account the tail of the transfer and persist the result"""
+        elapsed = time.monotonic() - self._since
+        if self._bytes and elapsed > 0:
+            self.tuning = self.tuner.observe_transfer(self.peer, self._bytes, elapsed)
+        self.tuner.save()
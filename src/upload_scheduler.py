@@ -0,0 +1,135 @@
+"""
+Upload Scheduler - Choking/unchoking of upload slots based on reciprocity
+"""
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+
+class UploadScheduler:
+    """Tit-for-tat allocation of a fixed number of upload slots
+
+    Peers we have uploads queued for are "interested". Every
+    rechoke_interval seconds the interested peers that upload to us
+    fastest get slots - 1 regular unchoked slots (on a pure seed, with
+    nothing downloaded, the ones we upload to fastest). The last slot
+    is an optimistic unchoke that rotates to a random other peer every
+    optimistic_rounds rechokes, so newcomers get a chance to show they
+    reciprocate. Uploads to a choked peer pause at the next chunk until
+    the peer is unchoked again. Until all slots are taken, an interested
+    peer is unchoked at once instead of waiting for the next rechoke.
+    """
+
+    SMOOTHING = 0.5  # Weight of the latest interval in the rate averages
+
+    def __init__(self, slots: int = 4, rechoke_interval: float = 10.0, optimistic_rounds: int = 3):
+        self.slots = max(1, slots)
+        self.rechoke_interval = rechoke_interval
+        self.optimistic_rounds = max(1, optimistic_rounds)
+        self.unchoked: Set[str] = set()
+        self.optimistic: Optional[str] = None
+        self._interest: Dict[str, int] = {}      # {peer: active or waiting uploads}
+        self._uploaded: Dict[str, int] = {}      # Bytes this interval
+        self._downloaded: Dict[str, int] = {}
+        self._upload_rate: Dict[str, float] = {}
+        self._download_rate: Dict[str, float] = {}
+        self._round = 0
+        self._last_rechoke = time.monotonic()
+        self._cond = threading.Condition()
+
+    def acquire(self, peer: str, timeout: Optional[float] = None) -> bool:
+        """Register an upload to peer and wait until it is unchoked"""
+        with self._cond:
+            self._interest[peer] = self._interest.get(peer, 0) + 1
+            if peer not in self.unchoked and len(self.unchoked) < self.slots:
+                self.unchoked.add(peer)
+            if self._cond.wait_for(lambda: peer in self.unchoked, timeout):
+                return True
+            self._drop_interest(peer)
+            return False
+
+    def release(self, peer: str):
+        """Finish an upload; frees the slot if it was the peer's last one"""
+        with self._cond:
+            self._drop_interest(peer)
+
+    def wait_unchoked(self, peer: str, timeout: Optional[float] = None) -> bool:
+        """Block a running upload while its peer is choked; False if still choked after timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: peer in self.unchoked, timeout)
+
+    def record_upload(self, peer: str, num_bytes: int):
+        with self._cond:
+            self._uploaded[peer] = self._uploaded.get(peer, 0) + num_bytes
+
+    def record_download(self, peer: str, num_bytes: int):
+        with self._cond:
+            self._downloaded[peer] = self._downloaded.get(peer, 0) + num_bytes
+
+    def rechoke(self):
+        """Recompute rates and re-pick the unchoked set"""
+        with self._cond:
+            now = time.monotonic()
+            elapsed = max(now - self._last_rechoke, 1e-6)
+            self._last_rechoke = now
+            self._update_rates(self._uploaded, self._upload_rate, elapsed)
+            self._update_rates(self._downloaded, self._download_rate, elapsed)
+
+            interested = list(self._interest)
+            seeding = not any(self._download_rate.get(peer, 0) for peer in interested)
+            rates = self._upload_rate if seeding else self._download_rate
+            ranked = sorted(interested, key=lambda peer: rates.get(peer, 0), reverse=True)
+            regular = ranked[:self.slots - 1]
+
+            self._round += 1
+            if (self.optimistic not in self._interest or self.optimistic in regular
+                    or self._round % self.optimistic_rounds == 0):
+                others = [peer for peer in interested if peer not in regular]
+                self.optimistic = random.choice(others) if others else None
+
+            self.unchoked = set(regular)
+            if self.optimistic is not None:
+                self.unchoked.add(self.optimistic)
+            # Leftover slots go to the best remaining interested peers
+            for peer in ranked:
+                if len(self.unchoked) >= self.slots:
+                    break
+                self.unchoked.add(peer)
+            self._cond.notify_all()
+
+    def get_stats(self) -> List[Dict]:
+        """Per-peer rates and choke state, for display"""
+        with self._cond:
+            peers = set(self._interest) | set(self._upload_rate) | set(self._download_rate)
+            return [{
+                'peer': peer,
+                'interested': peer in self._interest,
+                'unchoked': peer in self.unchoked,
+                'optimistic': peer == self.optimistic,
+                'upload_rate': self._upload_rate.get(peer, 0.0),
+                'download_rate': self._download_rate.get(peer, 0.0),
+            } for peer in sorted(peers)]
+
+    def _drop_interest(self, peer: str):
+        count = self._interest.get(peer, 0) - 1
+        if count > 0:
+            self._interest[peer] = count
+            return
+        self._interest.pop(peer, None)
+        if peer in self.unchoked:
+            self.unchoked.discard(peer)
+            # Hand the freed slot to a waiting peer right away
+            waiting = [p for p in self._interest if p not in self.unchoked]
+            if waiting:
+                rates = self._download_rate
+                self.unchoked.add(max(waiting, key=lambda p: rates.get(p, 0)))
+            self._cond.notify_all()
+
+    def _update_rates(self, counters: Dict[str, int], rates: Dict[str, float], elapsed: float):
+        for peer in set(counters) | set(rates):
+            sample = counters.get(peer, 0) / elapsed
+            rates[peer] = self.SMOOTHING * sample + (1 - self.SMOOTHING) * rates.get(peer, sample)
+            if rates[peer] < 1 and peer not in self._interest:
+                del rates[peer]  # Forget idle peers
+        counters.clear()
@@ -3,6 +3,7 @@ Enhanced UI Module - Additional UI components and themes
 """
 import tkinter as tk
 from tkinter import ttk
+from typing import Callable, Hashable, List, Optional, Tuple
 
 
 class ModernStyle:
@@ -186,3 +187,121 @@ class Tooltip:
         if self.tipwindow:
             self.tipwindow.destroy()
             self.tipwindow = None
+
+
+class VirtualListView(ttk.Frame):
+    """Scrollable list that only draws the rows in view
+
+    Rows are (key, text) pairs. set_rows() diffs the new rows against the
+    current ones and redraws just the visible slice, so refreshing 100k+
+    rows costs no Tk work for rows that are off screen or unchanged.
+    Selection is tracked by key, so it survives reordering and refreshes.
+    """
+    
+    def __init__(self, parent, row_height=20, empty_text="", **kwargs):
+        super().__init__(parent, **kwargs)
+        self.row_height = row_height
+        self.empty_text = empty_text
+        self._keys: List[Hashable] = []
+        self._texts = {}
+        self._top = 0  # Index of the first visible row
+        self._selected: Optional[Hashable] = None
+        self._on_select: Optional[Callable] = None
+        self._pool = []  # Recycled (background, text) canvas items
+        
+        self.scrollbar = ttk.Scrollbar(self, command=self.yview)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.canvas = tk.Canvas(self, bg="white", highlightthickness=1,
+                                highlightbackground=ModernStyle.COLORS['border'])
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self._empty_item = self.canvas.create_text(6, 4, anchor=tk.NW, text="", fill="#999999")
+        
+        self.canvas.bind("<Configure>", lambda event: self._redraw())
+        self.canvas.bind("<Button-1>", self._on_click)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)
+        self.canvas.bind("<Button-4>", lambda event: self.yview('scroll', -3, 'units'))
+        self.canvas.bind("<Button-5>", lambda event: self.yview('scroll', 3, 'units'))
+    
+    def set_rows(self, rows: List[Tuple[Hashable, str]]):
+        """Replace the rows, redrawing only if something in view changed"""
+        keys = [key for key, _ in rows]
+        texts = dict(rows)
+        if keys == self._keys and texts == self._texts:
+            return
+        self._keys = keys
+        self._texts = texts
+        if self._selected not in texts:
+            self._selected = None
+        self._top = max(0, min(self._top, len(keys) - self._visible_count() + 1))
+        self._redraw()
+    
+    def selected_key(self) -> Optional[Hashable]:
+        """Key of the selected row, or None"""
+        return self._selected
+    
+    def bind_select(self, callback: Callable):
+        """Call callback(key) when a row is clicked"""
+        self._on_select = callback
+    
+    def yview(self, *args):
+        """Scrollbar protocol: 'moveto' fraction or 'scroll' n units/pages"""
+        total = len(self._keys)
+        visible = self._visible_count()
+        if args and args[0] == 'moveto':
+            top = int(float(args[1]) * total)
+        elif args and args[0] == 'scroll':
+            step = int(args[1]) * (visible - 1 if args[2] == 'pages' else 1)
+            top = self._top + step
+        else:
+            return
+        top = max(0, min(top, total - visible + 1))
+        if top != self._top:
+            self._top = top
+            self._redraw()
+    
+    def _visible_count(self) -> int:
+        height = max(self.canvas.winfo_height(), self.row_height)
+        return height // self.row_height + 1
+    
+    def _redraw(self):
+        """Point the recycled row items at the rows currently in view"""
+        visible = self._visible_count()
+        width = self.canvas.winfo_width()
+        while len(self._pool) < visible:
+            background = self.canvas.create_rectangle(0, 0, 0, 0, width=0)
+            text = self.canvas.create_text(6, 0, anchor=tk.W)
+            self._pool.append((background, text))
+        
+        for slot, (background, text) in enumerate(self._pool):
+            index = self._top + slot
+            if slot < visible and index < len(self._keys):
+                key = self._keys[index]
+                y = slot * self.row_height
+                fill = ModernStyle.COLORS['accent'] if key == self._selected else "white"
+                self.canvas.coords(background, 0, y, width, y + self.row_height)
+                self.canvas.itemconfigure(background, fill=fill, state=tk.NORMAL)
+                self.canvas.coords(text, 6, y + self.row_height // 2)
+                self.canvas.itemconfigure(text, text=self._texts[key], state=tk.NORMAL,
+                                          fill="white" if key == self._selected else ModernStyle.COLORS['fg'])
+            else:
+                self.canvas.itemconfigure(background, state=tk.HIDDEN)
+                self.canvas.itemconfigure(text, state=tk.HIDDEN)
+        
+        self.canvas.itemconfigure(self._empty_item, text="" if self._keys else self.empty_text)
+        total = len(self._keys)
+        if total:
+            self.scrollbar.set(self._top / total, min(1.0, (self._top + visible - 1) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+    
+    def _on_click(self, event):
+        index = self._top + event.y // self.row_height
+        if 0 <= index < len(self._keys):
+            self._selected = self._keys[index]
+            self._redraw()
+            if self._on_select:
+                self._on_select(self._selected)
+    
+    def _on_wheel(self, event):
+        self.yview('scroll', -3 if event.delta > 0 else 3, 'units')
@@ -3,16 +3,19 @@ P2P File Sharing Application - Main UI
 """
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
-import threading
 import os
 from datetime import datetime
 import sys
 
-# Add src directory to path
+# Add src directory and project root (for config.py) to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from network_manager import NetworkManager
 from file_manager import FileManager
+from chunk_store import ChunkStore
+from config import NETWORK_CONFIG, FILE_CONFIG
+from enhanced_ui import VirtualListView
 
 
 class P2PFileShareApp:
@@ -24,11 +27,53 @@ class P2PFileShareApp:
         
         # Initialize managers
         shared_files_dir = os.path.join(os.path.dirname(__file__), '..', 'shared_files')
-        self.file_manager = FileManager(shared_files_dir)
-        self.network_manager = NetworkManager(callback=self.log_message)
+        app_dir = os.path.join(os.path.dirname(__file__), '..')
+        chunk_store = None
+        if FILE_CONFIG['CHUNK_STORE']:
+            chunk_store = ChunkStore(os.path.join(app_dir, 'chunk_store'),
+                                     FILE_CONFIG['CHUNK_STORE_CHUNK_SIZE'])
+        self.file_manager = FileManager(shared_files_dir, chunk_store)
+        self.network_manager = NetworkManager(
+            port=NETWORK_CONFIG['SERVER_PORT'],
+            callback=self.log_message,
+            shared_dir=shared_files_dir,
+            buffer_size=NETWORK_CONFIG['BUFFER_SIZE'],
+            max_mapped_bytes=NETWORK_CONFIG['MAX_MAPPED_BYTES'],
+            chunk_cache_bytes=NETWORK_CONFIG['CHUNK_CACHE_BYTES'],
+            max_pipeline_depth=NETWORK_CONFIG['MAX_PIPELINE_DEPTH'],
+            fsync_interval_bytes=NETWORK_CONFIG['FSYNC_INTERVAL_BYTES'],
+            max_socket_buffer=NETWORK_CONFIG['MAX_SOCKET_BUFFER'],
+            tuning_file=os.path.join(app_dir, 'peer_tuning.json'),
+            encryption=NETWORK_CONFIG['ENCRYPTION'],
+            identity_dir=os.path.join(app_dir, 'identity'),
+            require_tls=NETWORK_CONFIG['REQUIRE_TLS'],
+            dht_port=NETWORK_CONFIG['DHT_PORT'],
+            dht_bootstrap=NETWORK_CONFIG['DHT_BOOTSTRAP'],
+            pex_interval=NETWORK_CONFIG['PEX_INTERVAL'],
+            pex_fanout=NETWORK_CONFIG['PEX_FANOUT'],
+            pex_max_entries=NETWORK_CONFIG['PEX_MAX_ENTRIES'],
+            max_connections=NETWORK_CONFIG['MAX_CONNECTIONS'],
+            max_connections_per_ip=NETWORK_CONFIG['MAX_CONNECTIONS_PER_IP'],
+            listen_backlog=NETWORK_CONFIG['LISTEN_BACKLOG'],
+            retry_after=NETWORK_CONFIG['RETRY_AFTER'],
+            connection_timeout=NETWORK_CONFIG['CONNECTION_TIMEOUT'],
+            transfer_idle_timeout=NETWORK_CONFIG['TRANSFER_IDLE_TIMEOUT'],
+            upload_slots=NETWORK_CONFIG['UPLOAD_SLOTS'],
+            rechoke_interval=NETWORK_CONFIG['RECHOKE_INTERVAL'],
+            optimistic_unchoke_rounds=NETWORK_CONFIG['OPTIMISTIC_UNCHOKE_ROUNDS'],
+            chunk_store=chunk_store,
+            stream_http_port=NETWORK_CONFIG['STREAM_HTTP_PORT'],
+            stream_chunk_size=NETWORK_CONFIG['STREAM_CHUNK_SIZE'],
+            stream_read_ahead=NETWORK_CONFIG['STREAM_READ_AHEAD'],
+            stream_wait_timeout=NETWORK_CONFIG['STREAM_WAIT_TIMEOUT'],
+            catalog_filter_bits=NETWORK_CONFIG['CATALOG_FILTER_BITS'],
+            catalog_filter_hashes=NETWORK_CONFIG['CATALOG_FILTER_HASHES'],
+            catalog_refresh_interval=NETWORK_CONFIG['CATALOG_REFRESH_INTERVAL'],
+            max_file_size=FILE_CONFIG['MAX_FILE_SIZE'],
+        )
         
         # Variables
-        self.peer_name_var = tk.StringVar(value=f"Peer-{self.network_manager.peer_id}")
+        self.peer_name_var = tk.StringVar(value=f"Peer-{self.network_manager.peer_id[:8]}")
         self.is_running = False
         
         # Setup UI
@@ -83,13 +128,9 @@ class P2PFileShareApp:
         left_frame = ttk.LabelFrame(paned, text="Connected Peers", padding=10)
         paned.add(left_frame, weight=1)
         
-        # Peers listbox
-        peers_scroll = ttk.Scrollbar(left_frame)
-        peers_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        self.peers_listbox = tk.Listbox(left_frame, yscrollcommand=peers_scroll.set, height=15)
-        self.peers_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        peers_scroll.config(command=self.peers_listbox.yview)
+        # Peers list (only visible rows are drawn)
+        self.peers_list = VirtualListView(left_frame, empty_text="No peers connected")
+        self.peers_list.pack(fill=tk.BOTH, expand=True)
         
         # Peer actions
         peer_action_frame = ttk.Frame(left_frame)
@@ -100,18 +141,15 @@ class P2PFileShareApp:
         middle_frame = ttk.LabelFrame(paned, text="Shared Files", padding=10)
         paned.add(middle_frame, weight=1)
         
-        # Files listbox
-        files_scroll = ttk.Scrollbar(middle_frame)
-        files_scroll.pack(side=tk.RIGHT, fill=tk.Y)
-        
-        self.files_listbox = tk.Listbox(middle_frame, yscrollcommand=files_scroll.set, height=15)
-        self.files_listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        files_scroll.config(command=self.files_listbox.yview)
+        # Files list, keyed by file name
+        self.files_list = VirtualListView(middle_frame, empty_text="No shared files")
+        self.files_list.pack(fill=tk.BOTH, expand=True)
         
         # File actions
         file_action_frame = ttk.Frame(middle_frame)
         file_action_frame.pack(fill=tk.X, pady=5)
         ttk.Button(file_action_frame, text="Add File", command=self.add_file).pack(side=tk.LEFT, padx=2)
+        ttk.Button(file_action_frame, text="Add Folder", command=self.add_folder).pack(side=tk.LEFT, padx=2)
         ttk.Button(file_action_frame, text="Remove File", command=self.remove_file).pack(side=tk.LEFT, padx=2)
         ttk.Button(file_action_frame, text="Refresh", command=self.refresh_files).pack(side=tk.LEFT, padx=2)
         
@@ -173,41 +211,43 @@ class P2PFileShareApp:
             else:
                 messagebox.showerror("Error", "Failed to add file")
     
+    def add_folder(self):
+        """Add a whole folder to share"""
+        dir_path = filedialog.askdirectory(title="Select a folder to share")
+        if dir_path:
+            if self.file_manager.add_directory_to_share(dir_path):
+                dir_name = os.path.basename(os.path.normpath(dir_path))
+                self.log_message(f"Folder added: {dir_name}")
+                self.refresh_files()
+            else:
+                messagebox.showerror("Error", "Failed to add folder")
+    
     def remove_file(self):
         """Remove a file from sharing"""
-        selection = self.files_listbox.curselection()
-        if selection:
-            index = selection[0]
-            files = self.file_manager.get_shared_files()
-            if index < len(files):
-                file_name = files[index]['name']
-                if self.file_manager.remove_shared_file(file_name):
-                    self.log_message(f"File removed: {file_name}")
-                    self.refresh_files()
+        file_name = self.files_list.selected_key()
+        if file_name:
+            file_path = os.path.join(self.file_manager.shared_dir, file_name)
+            self.network_manager.mapped_files.invalidate(file_path)
+            if self.file_manager.remove_shared_file(file_name):
+                self.log_message(f"File removed: {file_name}")
+                self.refresh_files()
     
     def refresh_files(self):
         """Refresh the shared files list"""
-        self.files_listbox.delete(0, tk.END)
         files = self.file_manager.get_shared_files()
-        for file_info in files:
-            display_text = f"{file_info['name']} ({file_info['size_readable']})"
-            self.files_listbox.insert(tk.END, display_text)
+        self.files_list.set_rows([
+            (file_info['name'], f"{file_info['name']} ({file_info['size_readable']})")
+            for file_info in files
+        ])
     
     def refresh_peers(self):
         """Refresh the peers list"""
-        threading.Thread(target=self._refresh_peers_thread, daemon=True).start()
-    
-    def _refresh_peers_thread(self):
-        """Refresh peers in a separate thread"""
-        peers = self.network_manager.get_peers()
-        self.peers_listbox.delete(0, tk.END)
-        
-        if not peers:
-            self.peers_listbox.insert(tk.END, "No peers connected")
-        else:
-            for peer in peers:
-                display_text = f"{peer['name']} ({peer['ip']}:{peer['port']})"
-                self.peers_listbox.insert(tk.END, display_text)
+        # Snapshot in the UI thread; only changed rows in view are redrawn
+        peers = self.network_manager.peers.copy().items()
+        self.peers_list.set_rows([
+            (peer_id, f"{peer['name']} ({peer['ip']}:{peer['port']})")
+            for peer_id, peer in peers
+        ])
     
     def connect_to_peer(self):
         """Connect to a specific peer"""